@@ -1,8 +1,15 @@
 import os
+import re
+import sys
+import math
+import time
+import hashlib
 import requests
 import json
+from urllib.parse import urljoin, urlparse, parse_qs
 from langchain_ollama import OllamaLLM
-from langchain_community.agent_toolkits.nla.toolkit import NLAToolkit
+from langchain_community.agent_toolkits.nla.tool import NLATool
+from langchain_community.utilities.openapi import OpenAPISpec
 from crewai.tools import tool
 from crewai import Agent, Task, Crew, Process, LLM
 from textwrap import dedent
@@ -10,6 +17,409 @@ from textwrap import dedent
 # -----------------------------------------------------------
 # 1. TOOL DEFINITION
 # -----------------------------------------------------------
+# The OpenAPI spec is cached on disk and revalidated with ETag/Last-Modified at most
+# every SPEC_REVALIDATE_SECONDS. Next to it we keep a pre-parsed operation catalog
+# (path, method, summary, parameter names and enum values) that loads in milliseconds
+# and feeds an operation index, so each query builds and runs only the NLA tool for
+# the endpoint it actually needs.
+API_SPEC_URL = os.getenv("NLA_OPENAPI_URL", "https://petstore3.swagger.io/api/v3/openapi.json")
+SPEC_CACHE_DIR = os.getenv("NLA_SPEC_CACHE_DIR", ".openapi_cache")
+SPEC_REVALIDATE_SECONDS = int(os.getenv("NLA_SPEC_REVALIDATE_SECONDS", "300"))
+HTTP_METHODS = ("get", "put", "post", "delete", "patch")
+METHOD_WORDS = {
+    "get": "get list find show fetch retrieve search lookup",
+    "post": "add create new place submit",
+    "put": "update change modify replace",
+    "patch": "update change modify",
+    "delete": "delete remove cancel",
+}
+STOP_WORDS = {"a", "an", "the", "of", "for", "to", "in", "on", "and", "or", "with", "by", "is", "are", "all", "me", "my", "please"}
+
+
+def tokenize(text):
+    """Lower-cased word stems; camelCase, snake_case and path segments are split into words."""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(text)).replace("_", " ").lower()
+    stems = []
+    for word in re.findall(r"[a-z0-9]+", text):
+        if word in STOP_WORDS:
+            continue
+        for suffix in ("ing", "ies", "es", "s"):
+            if len(word) > len(suffix) + 2 and word.endswith(suffix):
+                word = word[: -len(suffix)] + ("y" if suffix == "ies" else "")
+                break
+        stems.append(word)
+    return stems
+
+
+def _resolve(spec, node):
+    """Follow local '#/components/...' references until a concrete object is reached."""
+    while isinstance(node, dict) and node.get("$ref", "").startswith("#/"):
+        target = spec
+        for part in node["$ref"][2:].split("/"):
+            target = target.get(part, {})
+        node = target
+    return node
+
+
+def build_operation_catalog(spec):
+    """Flatten an OpenAPI spec into one small record per operation."""
+    catalog = []
+    for path, item in spec.get("paths", {}).items():
+        shared_parameters = item.get("parameters", [])
+        for method in HTTP_METHODS:
+            if method not in item:
+                continue
+            operation = item[method]
+            parameters, enums, parameter_specs = [], [], []
+            for parameter in shared_parameters + operation.get("parameters", []):
+                parameter = _resolve(spec, parameter)
+                parameters.append(parameter.get("name", ""))
+                schema = _resolve(spec, parameter.get("schema", {}))
+                values = [str(v) for v in schema.get("enum", []) + _resolve(spec, schema.get("items", {})).get("enum", [])]
+                enums += values
+                parameter_specs.append({
+                    "name": parameter.get("name", ""),
+                    "in": parameter.get("in", "query"),
+                    "required": bool(parameter.get("required")) or parameter.get("in") == "path",
+                    "type": schema.get("type", "string"),
+                    "enum": values,
+                })
+            body_refs = re.findall(r"#/components/schemas/(\w+)", json.dumps(operation.get("requestBody", {})))
+            catalog.append({
+                "operation_id": operation.get("operationId", f"{method}_{path}"),
+                "path": path,
+                "method": method,
+                "summary": operation.get("summary", ""),
+                "description": operation.get("description", ""),
+                "parameters": parameters,
+                "parameter_specs": parameter_specs,
+                "enums": enums,
+                "body": sorted(set(body_refs)),
+            })
+    return catalog
+
+
+class SpecCache:
+    """On-disk OpenAPI spec plus its operation catalog, revalidated with conditional GETs."""
+
+    def __init__(self, cache_dir=SPEC_CACHE_DIR, revalidate_seconds=SPEC_REVALIDATE_SECONDS):
+        self.cache_dir = cache_dir
+        self.revalidate_seconds = revalidate_seconds
+        self._catalogs = {}
+        self._specs = {}
+
+    def _paths(self, url):
+        base = os.path.join(self.cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest()[:16])
+        return base + ".spec.json", base + ".meta.json", base + ".catalog.json"
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    @staticmethod
+    def _write_json(path, data):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+
+    def _parse(self, url, text):
+        try:
+            spec = json.loads(text)
+        except json.JSONDecodeError:
+            import yaml
+            spec = yaml.safe_load(text)
+        # Relative server URLs (e.g. '/api/v3') are resolved against the spec location.
+        servers = spec.get("servers") or [{"url": "/"}]
+        spec["servers"] = [dict(server, url=urljoin(url, server.get("url", "/"))) for server in servers]
+        return spec
+
+    def catalog(self, url):
+        """Operation catalog for the spec at `url`, refreshing the cache only when it has changed."""
+        spec_path, meta_path, catalog_path = self._paths(url)
+        if url in self._catalogs:
+            catalog, meta = self._catalogs[url]
+        else:
+            catalog, meta = self._read_json(catalog_path), self._read_json(meta_path) or {}
+        if catalog is not None and time.time() - meta.get("checked_at", 0) < self.revalidate_seconds:
+            self._catalogs[url] = (catalog, meta)
+            return catalog
+
+        headers = {}
+        if catalog is not None and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if catalog is not None and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        try:
+            response = requests.get(url, headers=headers, timeout=15)
+            if response.status_code != 304:
+                response.raise_for_status()
+                spec = self._parse(url, response.text)
+                catalog = build_operation_catalog(spec)
+                self._write_json(spec_path, spec)
+                self._write_json(catalog_path, catalog)
+                meta = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "fingerprint": hashlib.sha1(response.content).hexdigest(),
+                }
+                self._specs[url] = (meta["fingerprint"], spec)
+        except requests.RequestException as e:
+            if catalog is None:
+                raise
+            print(f"Could not revalidate {url} ({e}); using the cached spec.")
+        meta["checked_at"] = time.time()
+        self._write_json(meta_path, meta)
+        self._catalogs[url] = (catalog, meta)
+        return catalog
+
+    def revision(self, url):
+        """Version of the cached spec: its content fingerprint, or the ETag for caches written before fingerprints."""
+        self.catalog(url)
+        meta = self._catalogs[url][1]
+        return meta.get("fingerprint") or meta.get("etag") or ""
+
+    def spec(self, url):
+        """Parsed spec, read from disk once and kept in memory until revalidation brings a new revision."""
+        revision = self.revision(url)
+        cached = self._specs.get(url)
+        if cached is None or cached[0] != revision:
+            cached = self._specs[url] = (revision, self._read_json(self._paths(url)[0]))
+        return cached[1]
+
+
+class OperationIndex:
+    """Term index over the catalog that picks the operation best matching a query."""
+
+    def __init__(self, catalog):
+        self.operations = catalog
+        documents = []
+        for operation in catalog:
+            weights = {}
+            fields = [
+                (operation["operation_id"], 3.0),
+                (" ".join(p for p in operation["path"].split("/") if not p.startswith("{")), 2.0),
+                (METHOD_WORDS.get(operation["method"], ""), 1.0),
+                (operation["summary"], 2.0),
+                (operation["description"], 1.0),
+                (" ".join(operation["parameters"] + operation["enums"] + operation["body"]), 2.0),
+            ]
+            for text, weight in fields:
+                for term in tokenize(text):
+                    weights[term] = max(weights.get(term, 0.0), weight)
+            documents.append(weights)
+        frequency = {}
+        for weights in documents:
+            for term in weights:
+                frequency[term] = frequency.get(term, 0) + 1
+        self.index = {}
+        for position, weights in enumerate(documents):
+            for term, weight in weights.items():
+                self.index.setdefault(term, []).append((position, weight * math.log(1 + len(documents) / frequency[term])))
+
+    def rank(self, query, limit=3):
+        totals = {}
+        for term in set(tokenize(query)):
+            for position, weight in self.index.get(term, ()):
+                totals[position] = totals.get(position, 0.0) + weight
+        ranked = sorted(totals.items(), key=lambda item: -item[1])[:limit]
+        return [(self.operations[position], score) for position, score in ranked]
+
+    def best(self, query):
+        ranked = self.rank(query, limit=1)
+        return ranked[0][0] if ranked else None
+
+
+# Questions that need several read-only operations ("list available pets and the
+# store inventory") are split into clauses, each mapped to a GET operation. A clause
+# whose required parameter is not in the text depends on an earlier step that
+# returns that resource and fans out over the ids it produced; when no earlier step
+# returns it, the query is left to the single-operation NLA path. Independent steps run
+# concurrently on one pooled HTTP session and the JSON responses are merged.
+CLAUSE_SPLIT = re.compile(r"\s*(?:[,;]|\band then\b|\bthen\b|\band\b|\bplus\b|\bas well as\b|\balong with\b)\s*")
+PLAN_MAX_WORKERS = 8
+FAN_OUT_LIMIT = 10
+COMPACT_MAX_ITEMS = 10
+
+
+def bind_parameters(operation, clause):
+    """Fill parameters from the clause text; returns (bound params, names of required params still missing)."""
+    words = set(re.findall(r"[a-z0-9]+", clause.lower()))
+    numbers = re.findall(r"\b\d+\b", clause)
+    quoted = re.findall(r"['\"]([^'\"]+)['\"]", clause)
+    bound, missing = {}, []
+    for parameter in operation.get("parameter_specs", []):
+        value = None
+        if parameter["enum"]:
+            value = next((v for v in parameter["enum"] if v.lower() in words), None)
+        elif parameter["type"] in ("integer", "number") and numbers:
+            value = numbers.pop(0)
+        elif parameter["type"] == "string" and quoted:
+            value = quoted.pop(0)
+        if value is not None:
+            bound[parameter["name"]] = value
+        elif parameter["required"]:
+            missing.append(parameter["name"])
+    return bound, missing
+
+
+def plan_operations(query, index):
+    """
+    Break a query into a DAG of GET operations.
+
+    Returns:
+        List of steps {operation, params, depends_on, fan_out}, or None when the
+        query is a single operation or needs anything other than read-only calls
+    """
+    clauses = [c for c in CLAUSE_SPLIT.split(query) if c and c.strip()]
+    if len(clauses) < 2:
+        return None
+    steps = []
+    for clause in clauses:
+        operation = index.best(clause)
+        if operation is None or operation["method"] != "get":
+            return None
+        params, missing = bind_parameters(operation, clause)
+        if len(missing) > 1 or (missing and not steps):
+            return None
+        depends_on, fan_out = None, None
+        if missing:
+            fan_out = missing[0]
+            resource = re.sub(r"(?i)_?id$", "", fan_out).lower()
+            producers = [i for i, step in enumerate(steps) if f"/{resource}" in step["operation"]["path"].lower()]
+            if not producers:
+                return None  # Nothing earlier yields this resource; ids of another one would fetch wrong records
+            depends_on = producers[-1]
+        step = {"operation": operation, "params": params, "depends_on": depends_on, "fan_out": fan_out}
+        if step not in steps:
+            steps.append(step)
+    return steps if len(steps) > 1 else None
+
+
+def _fan_out_values(data, parameter):
+    """
+    Values for `parameter` found in a producer's JSON response: same-named fields first,
+    then 'id' (the producer returns the parameter's resource, see plan_operations).
+    """
+    records = data if isinstance(data, list) else [data]
+    records = [r for r in records if isinstance(r, dict)]
+    values = [r[parameter] for r in records if r.get(parameter) is not None]
+    if not values:
+        values = [r["id"] for r in records if r.get("id") is not None]
+    return list(dict.fromkeys(values))[:FAN_OUT_LIMIT]
+
+
+def compact_json(data, max_items=COMPACT_MAX_ITEMS):
+    """Drop empty fields and truncate long lists so merged responses stay small."""
+    if isinstance(data, dict):
+        return {k: compact_json(v, max_items) for k, v in data.items() if v not in (None, "", [], {})}
+    if isinstance(data, list):
+        items = [compact_json(v, max_items) for v in data[:max_items]]
+        if len(data) > max_items:
+            items.append(f"... {len(data) - max_items} more")
+        return items
+    return data
+
+
+def execute_plan(steps, base_url, max_workers=PLAN_MAX_WORKERS, session=None):
+    """Run the plan level by level, concurrently within each level, and merge the responses."""
+    from concurrent.futures import ThreadPoolExecutor
+    from requests.adapters import HTTPAdapter
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+    def call(operation, params):
+        path_params = {p["name"] for p in operation.get("parameter_specs", []) if p["in"] == "path"}
+        path = operation["path"].format(**{k: v for k, v in params.items() if k in path_params})
+        query_params = {k: v for k, v in params.items() if k not in path_params}
+        response = session.get(base_url.rstrip("/") + path, params=query_params, timeout=15)
+        response.raise_for_status()
+        return response.json()
+
+    results = [None] * len(steps)
+    remaining = list(range(len(steps)))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while remaining:
+            ready = [i for i in remaining if steps[i]["depends_on"] is None or results[steps[i]["depends_on"]] is not None]
+            if not ready:
+                break
+            futures = {}
+            for i in ready:
+                step = steps[i]
+                if step["fan_out"] is None:
+                    futures[i] = pool.submit(call, step["operation"], step["params"])
+                else:
+                    values = _fan_out_values(results[step["depends_on"]], step["fan_out"])
+                    if not values:
+                        producer = steps[step["depends_on"]]["operation"]["operation_id"]
+                        results[i] = {"error": f"{producer} returned no {step['fan_out']} values"}
+                        continue
+                    futures[i] = {v: pool.submit(call, step["operation"], dict(step["params"], **{step["fan_out"]: v})) for v in values}
+            for i, future in futures.items():
+                try:
+                    if isinstance(future, dict):
+                        results[i] = {str(v): f.result() for v, f in future.items()}
+                    else:
+                        results[i] = future.result()
+                except Exception as e:
+                    results[i] = {"error": str(e)}
+            remaining = [i for i in remaining if i not in ready]
+
+    merged = {}
+    for step, result in zip(steps, results):
+        key = step["operation"]["operation_id"]
+        merged[key if key not in merged else f"{key}_{len(merged)}"] = compact_json(result)
+    return json.dumps(merged, separators=(",", ":"), default=str)
+
+
+spec_cache = SpecCache()
+_operation_indexes = {}
+_operation_tools = {}
+_nla_specs = {}
+_nla_llm = None
+
+
+def get_operation_index(url):
+    """Operation index for the current catalog, rebuilt only when the catalog is refreshed."""
+    catalog = spec_cache.catalog(url)
+    index = _operation_indexes.get(url)
+    if index is None or index.operations is not catalog:
+        index = _operation_indexes[url] = OperationIndex(catalog)
+    return index
+
+
+def get_operation_tool(url, operation):
+    """Build (once per spec revision) the NLA tool for a single operation of the cached spec."""
+    global _nla_llm
+    revision = spec_cache.revision(url)
+    key = (url, revision, operation["path"], operation["method"])
+    if key not in _operation_tools:
+        if _nla_llm is None:
+            # We will use the mistral model for this LLM instance
+            _nla_llm = OllamaLLM(model="mistral")
+        if (url, revision) not in _nla_specs:
+            # The spec changed: tools built from the previous revision are dropped
+            for stale in [k for k in _operation_tools if k[0] == url]:
+                del _operation_tools[stale]
+            for stale in [k for k in _nla_specs if k[0] == url]:
+                del _nla_specs[stale]
+            _nla_specs[(url, revision)] = OpenAPISpec.from_spec_dict(spec_cache.spec(url))
+        _operation_tools[key] = NLATool.from_llm_and_method(
+            llm=_nla_llm,
+            path=operation["path"],
+            method=operation["method"],
+            spec=_nla_specs[(url, revision)]
+        )
+    return _operation_tools[key]
+
+
 @tool("Natural Language API Tool")
 def natural_language_api_tool(query: str) -> str:
     """
@@ -17,23 +427,25 @@ def natural_language_api_tool(query: str) -> str:
     This tool uses a LangChain Natural Language API (NLA) Toolkit
     to query an API described by an OpenAPI spec.
     """
-    api_spec_url = "https://petstore3.swagger.io/api/v3/openapi.json"
+    api_spec_url = API_SPEC_URL
     
     try:
-        print(f"Fetching OpenAPI spec from: {api_spec_url} using NLAToolkit's built-in method.")
-        
-        # We will use the mistral model for this LLM instance
-        llm = OllamaLLM(model="mistral")
-        
-        nla_toolkit = NLAToolkit.from_llm_and_url(
-            llm=llm,
-            open_api_url=api_spec_url
-        )
-        
-        if not nla_toolkit or not nla_toolkit.get_tools():
-            return "Error: NLA Toolkit could not be initialized or contains no tools."
-            
-        tool_to_use = nla_toolkit.get_tools()[0]
+        index = get_operation_index(api_spec_url)
+        if not index.operations:
+            return "Error: The OpenAPI spec does not describe any operations."
+
+        steps = plan_operations(query, index)
+        if steps is not None:
+            print("Executing plan: " + ", ".join(step["operation"]["operation_id"] for step in steps))
+            return execute_plan(steps, spec_cache.spec(api_spec_url)["servers"][0]["url"])
+
+        operation = index.best(query)
+        if operation is None:
+            examples = ", ".join(f"{op['method'].upper()} {op['path']}" for op in index.operations[:10])
+            return f"No API operation matches '{query}'. Available operations include: {examples}"
+
+        print(f"Selected operation: {operation['method'].upper()} {operation['path']} ({operation['operation_id']})")
+        tool_to_use = get_operation_tool(api_spec_url, operation)
         
         return tool_to_use.run(query)
         
@@ -95,9 +507,190 @@ petstore_crew = Crew(
 )
 
 # -----------------------------------------------------------
-# 6. EXECUTION AND TESTING
+# 6. LOCAL STUB AND BENCHMARK
+# -----------------------------------------------------------
+STUB_PETSTORE_SPEC = {
+    "openapi": "3.0.2",
+    "info": {"title": "Swagger Petstore (stub)", "version": "1.0.0"},
+    "servers": [{"url": "/api/v3"}],
+    "paths": {
+        "/pet": {
+            "post": {"operationId": "addPet", "summary": "Add a new pet to the store",
+                     "requestBody": {"content": {"application/json": {"schema": {"$ref": "#/components/schemas/Pet"}}}},
+                     "responses": {"200": {"description": "ok"}}},
+            "put": {"operationId": "updatePet", "summary": "Update an existing pet",
+                    "requestBody": {"content": {"application/json": {"schema": {"$ref": "#/components/schemas/Pet"}}}},
+                    "responses": {"200": {"description": "ok"}}},
+        },
+        "/pet/findByStatus": {
+            "get": {"operationId": "findPetsByStatus", "summary": "Finds Pets by status",
+                    "parameters": [{"name": "status", "in": "query",
+                                    "schema": {"type": "string", "enum": ["available", "pending", "sold"]}}],
+                    "responses": {"200": {"description": "ok"}}},
+        },
+        "/pet/{petId}": {
+            "get": {"operationId": "getPetById", "summary": "Find pet by ID",
+                    "parameters": [{"name": "petId", "in": "path", "required": True, "schema": {"type": "integer"}}],
+                    "responses": {"200": {"description": "ok"}}},
+            "delete": {"operationId": "deletePet", "summary": "Deletes a pet",
+                       "parameters": [{"name": "petId", "in": "path", "required": True, "schema": {"type": "integer"}}],
+                       "responses": {"200": {"description": "ok"}}},
+        },
+        "/store/inventory": {
+            "get": {"operationId": "getInventory", "summary": "Returns pet inventories by status",
+                    "responses": {"200": {"description": "ok"}}},
+        },
+        "/store/order/{orderId}": {
+            "get": {"operationId": "getOrderById", "summary": "Find purchase order by ID",
+                    "parameters": [{"name": "orderId", "in": "path", "required": True, "schema": {"type": "integer"}}],
+                    "responses": {"200": {"description": "ok"}}},
+        },
+        "/user/{username}": {
+            "get": {"operationId": "getUserByName", "summary": "Get user by user name",
+                    "parameters": [{"name": "username", "in": "path", "required": True, "schema": {"type": "string"}}],
+                    "responses": {"200": {"description": "ok"}}},
+        },
+    },
+    "components": {"schemas": {"Pet": {"type": "object", "properties": {"id": {"type": "integer"}, "name": {"type": "string"}}}}},
+}
+
+
+def stub_api_response(path):
+    """Canned petstore payloads for the stub server's API routes."""
+    route = urlparse(path)
+    parts = route.path.split("/")[3:]  # Strip the leading '/api/v3'
+    if parts[:2] == ["pet", "findByStatus"]:
+        status = parse_qs(route.query).get("status", ["available"])[0]
+        return [{"id": i, "name": f"pet-{i}", "status": status, "photoUrls": [], "tags": []} for i in range(1, 21)]
+    if parts[:1] == ["pet"] and len(parts) == 2 and parts[1].isdigit():
+        return {"id": int(parts[1]), "name": f"pet-{parts[1]}", "category": {"id": 1, "name": "Dogs"}, "status": "available"}
+    if parts[:2] == ["store", "inventory"]:
+        return {"available": 20, "pending": 3, "sold": 7}
+    if parts[:2] == ["store", "order"] and len(parts) == 3 and parts[2].isdigit():
+        return {"id": int(parts[2]), "petId": int(parts[2]), "quantity": 1, "status": "placed", "complete": False}
+    return None
+
+
+def start_stub_server(spec=STUB_PETSTORE_SPEC, latency=0.05):
+    """
+    Serve `spec` at /api/v3/openapi.json (with ETag/Last-Modified support) and canned
+    petstore API responses after `latency` seconds; returns (server, spec URL).
+    """
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    body = json.dumps(spec).encode("utf-8")
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    last_modified = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime())
+    counters = {"200": 0, "304": 0}
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if not self.path.endswith("/openapi.json"):
+                time.sleep(latency)
+                payload = stub_api_response(self.path)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(200 if payload is not None else 404)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+            if self.headers.get("If-None-Match") == etag or self.headers.get("If-Modified-Since") == last_modified:
+                counters["304"] += 1
+                self.send_response(304)
+                self.end_headers()
+                return
+            counters["200"] += 1
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.counters = counters
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api/v3/openapi.json"
+
+
+def benchmark_spec_cache(queries=("List all available pets.", "Find the pet with id 10", "Show the store inventory",
+                                  "Delete pet 3", "Get order 5", "Add a new pet named Rex")):
+    """Time cold fetch, in-memory and on-disk loads, 304 revalidation and routing against the stub."""
+    import shutil
+    import tempfile
+    server, url = start_stub_server()
+    cache_dir = tempfile.mkdtemp(prefix="nla_bench_")
+    try:
+        def timed(label, action):
+            start = time.perf_counter()
+            result = action()
+            print(f"{label:<32} {(time.perf_counter() - start) * 1000:8.2f} ms")
+            return result
+
+        cache = SpecCache(cache_dir)
+        timed("cold fetch + parse + catalog", lambda: cache.catalog(url))
+        timed("warm (in memory)", lambda: cache.catalog(url))
+        timed("warm (from disk, new process)", lambda: SpecCache(cache_dir).catalog(url))
+        timed("conditional revalidation", lambda: SpecCache(cache_dir, revalidate_seconds=0).catalog(url))
+        print(f"stub responses: {server.counters}")
+        index = timed("build operation index", lambda: OperationIndex(cache.catalog(url)))
+        for query in queries:
+            operation = index.best(query)
+            print(f"  {query!r:<32} -> {operation['method'].upper()} {operation['path']}")
+        start = time.perf_counter()
+        for _ in range(1000):
+            index.best(queries[0])
+        print(f"routing latency                  {(time.perf_counter() - start) * 1000:8.3f} us")
+    finally:
+        server.shutdown()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def benchmark_plans(queries=("List all available pets and show the store inventory",
+                             "Find available pets, then get each pet by id and the store inventory",
+                             "List sold pets and get the order for each pet")):
+    """Compare sequential one-call-at-a-time execution with the concurrent plan executor."""
+    import shutil
+    import tempfile
+    server, url = start_stub_server()
+    cache_dir = tempfile.mkdtemp(prefix="nla_bench_")
+    try:
+        cache = SpecCache(cache_dir)
+        index = OperationIndex(cache.catalog(url))
+        base_url = cache.spec(url)["servers"][0]["url"]
+        for query in queries:
+            steps = plan_operations(query, index)
+            print(f"{query!r}")
+            if steps is None:
+                print("  plan: none, answered through the single-operation NLA path")
+                continue
+            print("  plan: " + " | ".join(
+                f"{s['operation']['operation_id']}{' <- step ' + str(s['depends_on']) + ' ' + s['fan_out'] if s['fan_out'] else ''}"
+                for s in steps))
+            start = time.perf_counter()
+            execute_plan(steps, base_url, max_workers=1, session=requests)
+            sequential = time.perf_counter() - start
+            start = time.perf_counter()
+            merged = execute_plan(steps, base_url)
+            concurrent = time.perf_counter() - start
+            print(f"  sequential {sequential * 1000:7.1f} ms | planned {concurrent * 1000:7.1f} ms | {len(merged)} chars merged")
+    finally:
+        server.shutdown()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+# -----------------------------------------------------------
+# 7. EXECUTION AND TESTING
 # -----------------------------------------------------------
-if __name__ == "__main__":
+if __name__ == "__main__" and "--benchmark" in sys.argv:
+    benchmark_spec_cache()
+    benchmark_plans()
+elif __name__ == "__main__":
     print("## Starting the Petstore API Crew")
     result = petstore_crew.kickoff()
     print("\n\n################################################")
@@ -1,5 +1,17 @@
 import os
+import re
+import sys
 import json
+import time
+import queue
+import random
+import hashlib
+import threading
+import uuid
+import html.parser
+from collections import Counter
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from crewai import Agent, Task, Crew, LLM
 from crewai.tools import tool
 from dotenv import load_dotenv
@@ -13,6 +25,22 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 VECTARA_API_KEY = os.getenv("VECTARA_API_KEY")
 VECTARA_CORPUS_KEY = os.getenv("VECTARA_CORPUS_KEY")
 
+# "vectara" (default) uses the hosted corpus; "local" answers from an on-disk index
+# built from the documents in VECTARA_LOCAL_CORPUS
+RAG_BACKEND = os.getenv("VECTARA_BACKEND", "vectara").lower()
+LOCAL_CORPUS_DIR = os.getenv("VECTARA_LOCAL_CORPUS", "corpus")
+LOCAL_INDEX_DIR = os.getenv("VECTARA_LOCAL_INDEX", ".vectara_local")
+EMBEDDING_DIM = 256
+IVF_MIN_CHUNKS = 50_000
+# VECTARA_STREAM=1 prints the answer as it is generated; VECTARA_RERANK=bm25 or
+# cross-encoder re-scores a wider candidate set locally and summarizes only the best few
+STREAM_ANSWERS = os.getenv("VECTARA_STREAM", "").lower() in ("1", "true", "yes")
+RERANK_MODE = os.getenv("VECTARA_RERANK", "").lower()
+RERANK_CANDIDATES = 20
+RERANK_KEEP = 3
+INGEST_MANIFEST = os.getenv("VECTARA_INGEST_MANIFEST", ".vectara_ingest/manifest.json")
+DOCUMENT_EXTENSIONS = (".pdf", ".html", ".htm", ".md", ".markdown", ".txt")
+
 def setup_gemini_llm():
     return LLM(
         model="gemini/gemini-2.5-flash",
@@ -21,35 +49,768 @@ def setup_gemini_llm():
         max_tokens=4096
     )
 
+def tokenize(text):
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def split_sentences(text):
+    return [s.strip() for s in re.split(r"(?<=[.!?])\s+", text) if len(s.strip()) > 20]
+
+
+def chunk_text(text, size=800, overlap=100):
+    """Split text into overlapping character windows, breaking on whitespace."""
+    text = " ".join(text.split())
+    chunks, start = [], 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            cut = text.rfind(" ", start + size // 2, end)
+            end = cut if cut > start else end
+        chunks.append(text[start:end].strip())
+        if end == len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return [c for c in chunks if c]
+
+
+class _HTMLText(html.parser.HTMLParser):
+    SKIP = {"script", "style", "noscript", "template", "svg"}
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self.depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self.depth:
+            self.depth -= 1
+
+    def handle_data(self, data):
+        if not self.depth:
+            self.parts.append(data)
+
+
+def extract_text(path):
+    """Plain text of a PDF, HTML, Markdown or text file ("" if it can't be read)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".pdf":
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            return ""
+        return "\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        text = f.read()
+    if ext in (".html", ".htm"):
+        parser = _HTMLText()
+        parser.feed(text)
+        return " ".join(parser.parts)
+    if ext in (".md", ".markdown"):
+        text = re.sub(r"```.*?```", " ", text, flags=re.DOTALL)
+        text = re.sub(r"!?\[([^\]]*)\]\([^)]*\)", r"\1", text)
+        text = re.sub(r"^[#>*\-+\s]+|[*_`]", "", text, flags=re.MULTILINE)
+    return text
+
+
+class HashingEmbedder:
+    """
+    Stateless bag-of-words embedder: unigrams and bigrams are hashed into a fixed number
+    of signed buckets and the result is L2-normalized, so no model download is needed.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+
+    def _features(self, text):
+        words = tokenize(text)
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                vectors[row, digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+def kmeans(data, k, iterations=10, seed=0):
+    """Plain Lloyd's k-means on float32 rows; returns the (k, dim) centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=len(data) < k)].copy()
+    for _ in range(iterations):
+        assignment = nearest_centroid(data, centroids)
+        counts = np.bincount(assignment, minlength=k)
+        empty = counts == 0
+        order = np.argsort(assignment, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[~empty]
+        centroids[~empty] = np.add.reduceat(data[order], starts, axis=0) / counts[~empty, None]
+        centroids[empty] = data[rng.choice(len(data), size=int(empty.sum()))]
+    return centroids
+
+
+def nearest_centroid(data, centroids, batch_size=65536):
+    """Index of the closest centroid (L2) for every row, computed in batches."""
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    out = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), batch_size):
+        batch = np.asarray(data[start:start + batch_size], dtype=np.float32)
+        out[start:start + batch_size] = np.argmin(centroid_norms - 2 * batch @ centroids.T, axis=1)
+    return out
+
+
+class LocalVectorStore:
+    """
+    In-memory vector index over unit-length embeddings.
+
+    Vectors are kept as float16 (or int8 with a per-row scale) for exact brute-force search.
+    `train_ivfpq` adds an IVF coarse quantizer with product-quantized residuals (one
+    uint8 code per subspace) for approximate search over large corpora.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM, dtype="float16"):
+        self.dim = dim
+        self.dtype = dtype
+        self.vectors = np.zeros((0, dim), dtype=np.int8 if dtype == "int8" else np.float16)
+        self.scales = np.zeros(0, dtype=np.float32)
+        self.chunks = []
+        self.ivf = None
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def _decode(self, rows, ids=slice(None)):
+        rows = rows.astype(np.float32)
+        return rows * self.scales[ids, None] if self.dtype == "int8" else rows
+
+    def add(self, vectors, chunks):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dtype == "int8":
+            scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+            self.scales = np.concatenate([self.scales, scales.astype(np.float32)])
+            encoded = np.rint(vectors / scales[:, None]).astype(np.int8)
+        else:
+            encoded = vectors.astype(np.float16)
+        self.vectors = np.concatenate([self.vectors, encoded])
+        self.chunks.extend(chunks)
+        self.ivf = None
+
+    def remove(self, ids):
+        """Drop every row whose chunk carries one of `ids`; returns how many were removed."""
+        ids = set(ids)
+        keep = np.array([chunk.get("id") not in ids for chunk in self.chunks], dtype=bool)
+        removed = len(self.chunks) - int(keep.sum())
+        if removed:
+            self.vectors = np.asarray(self.vectors)[keep]
+            if self.dtype == "int8":
+                self.scales = self.scales[keep]
+            self.chunks = [chunk for chunk, kept in zip(self.chunks, keep) if kept]
+            self.ivf = None
+        return removed
+
+    def search_exact(self, query, k=10, batch_size=262144):
+        """Top-k by inner product over every stored vector; returns (ids, scores)."""
+        query = np.asarray(query, dtype=np.float32)
+        best_ids, best_scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        for start in range(0, len(self.vectors), batch_size):
+            rows = slice(start, start + batch_size)
+            scores = self._decode(self.vectors[rows], rows) @ query
+            top = np.argpartition(-scores, min(k, len(scores) - 1))[:k]
+            best_ids = np.concatenate([best_ids, top + start])
+            best_scores = np.concatenate([best_scores, scores[top]])
+        order = np.argsort(-best_scores)[:k]
+        return best_ids[order], best_scores[order]
+
+    def train_ivfpq(self, nlist=None, subspaces=32, sample_size=65536, iterations=10, seed=0):
+        """Train the coarse quantizer and PQ codebooks on a sample, then encode every vector."""
+        n = len(self.vectors)
+        nlist = nlist or max(int(np.sqrt(n)), 1)
+        rng = np.random.default_rng(seed)
+        picked = rng.choice(n, size=min(sample_size, n), replace=False)
+        sample = self._decode(self.vectors[picked], picked)
+        coarse = kmeans(sample, nlist, iterations, seed)
+        sub_dim = self.dim // subspaces
+        residuals = sample - coarse[nearest_centroid(sample, coarse)]
+        codebooks = np.stack([
+            kmeans(residuals[:, j * sub_dim:(j + 1) * sub_dim], 256, iterations, seed + j)
+            for j in range(subspaces)
+        ])
+
+        assignment = np.empty(n, dtype=np.int32)
+        codes = np.empty((n, subspaces), dtype=np.uint8)
+        for start in range(0, n, 65536):
+            rows = slice(start, start + 65536)
+            batch = self._decode(self.vectors[rows], rows)
+            lists = nearest_centroid(batch, coarse)
+            residual = batch - coarse[lists]
+            assignment[start:start + 65536] = lists
+            for j in range(subspaces):
+                codes[start:start + 65536, j] = nearest_centroid(residual[:, j * sub_dim:(j + 1) * sub_dim], codebooks[j])
+
+        order = np.argsort(assignment, kind="stable")
+        self.ivf = {
+            "coarse": coarse,
+            "codebooks": codebooks,
+            "ids": order,
+            "codes": codes[order],
+            "offsets": np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=nlist))]),
+        }
+
+    def search_ivfpq(self, query, k=10, nprobe=16, refine=10):
+        """
+        Approximate top-k: scan `nprobe` inverted lists with asymmetric PQ distances, then
+        re-score the best `refine * k` candidates exactly against the stored vectors.
+        """
+        if self.ivf is None:
+            return self.search_exact(query, k)
+        query = np.asarray(query, dtype=np.float32)
+        ivf = self.ivf
+        coarse, codebooks = ivf["coarse"], ivf["codebooks"]
+        subspaces, _, sub_dim = codebooks.shape
+        probes = np.argsort(((coarse - query) ** 2).sum(axis=1))[:nprobe]
+
+        candidate_ids, candidate_dist = [], []
+        for lst in probes:
+            start, end = ivf["offsets"][lst], ivf["offsets"][lst + 1]
+            if start == end:
+                continue
+            residual = (query - coarse[lst]).reshape(subspaces, 1, sub_dim)
+            table = ((codebooks - residual) ** 2).sum(axis=2)
+            candidate_dist.append(table[np.arange(subspaces), ivf["codes"][start:end]].sum(axis=1))
+            candidate_ids.append(ivf["ids"][start:end])
+        if not candidate_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        candidate_ids = np.concatenate(candidate_ids)
+        candidate_dist = np.concatenate(candidate_dist)
+
+        shortlist = min(refine * k, len(candidate_ids))
+        keep = candidate_ids[np.argpartition(candidate_dist, shortlist - 1)[:shortlist]]
+        scores = self._decode(self.vectors[keep], keep) @ query
+        order = np.argsort(-scores)[:k]
+        return keep[order], scores[order]
+
+    def search(self, query, k=10):
+        return self.search_ivfpq(query, k) if self.ivf is not None else self.search_exact(query, k)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "vectors.npy"), self.vectors)
+        if self.dtype == "int8":
+            np.save(os.path.join(directory, "scales.npy"), self.scales)
+        with open(os.path.join(directory, "chunks.jsonl"), "w", encoding="utf-8") as f:
+            for chunk in self.chunks:
+                f.write(json.dumps(chunk) + "\n")
+        if self.ivf is not None:
+            self.save_ivf(directory)
+        elif os.path.exists(os.path.join(directory, "ivfpq.npz")):
+            os.remove(os.path.join(directory, "ivfpq.npz"))
+
+    def save_ivf(self, directory):
+        np.savez(os.path.join(directory, "ivfpq.npz"), **self.ivf)
+
+    @classmethod
+    def load(cls, directory):
+        vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        store = cls(vectors.shape[1], "int8" if vectors.dtype == np.int8 else "float16")
+        store.vectors = vectors
+        if store.dtype == "int8":
+            store.scales = np.load(os.path.join(directory, "scales.npy"))
+        ivf_path = os.path.join(directory, "ivfpq.npz")
+        if os.path.exists(ivf_path):
+            with np.load(ivf_path) as ivf:
+                store.ivf = {name: ivf[name] for name in ivf.files}
+        with open(os.path.join(directory, "chunks.jsonl"), encoding="utf-8") as f:
+            store.chunks = [json.loads(line) for line in f]
+        return store
+
+
+def build_local_store(corpus_dir, embedder):
+    """Chunk and embed every supported document under `corpus_dir`."""
+    store = LocalVectorStore(embedder.dim)
+    for root, _, files in os.walk(corpus_dir):
+        for name in sorted(files):
+            if not name.lower().endswith(DOCUMENT_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            chunks = chunk_text(extract_text(path))
+            if chunks:
+                store.add(embedder.embed(chunks), [{"text": c, "source": path} for c in chunks])
+    return store
+
+
+def bm25_scores(query, texts, k1=1.5, b=0.75):
+    """Okapi BM25 of `query` against each text, with IDF taken over the texts themselves."""
+    docs = [tokenize(t) for t in texts]
+    avg_len = max(np.mean([len(d) for d in docs]), 1.0) if docs else 1.0
+    df = Counter(term for doc in docs for term in set(doc))
+    terms = set(tokenize(query))
+    scores = []
+    for doc in docs:
+        tf = Counter(doc)
+        norm = k1 * (1 - b + b * len(doc) / avg_len)
+        scores.append(sum(
+            np.log(1 + (len(docs) - df[t] + 0.5) / (df[t] + 0.5)) * tf[t] * (k1 + 1) / (tf[t] + norm)
+            for t in terms if t in tf
+        ))
+    return np.array(scores, dtype=np.float32)
+
+
+_cross_encoder = None
+
+
+def get_cross_encoder():
+    """ms-marco MiniLM cross-encoder if sentence-transformers is installed, else None."""
+    global _cross_encoder
+    if _cross_encoder is None:
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            return None
+        _cross_encoder = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+    return _cross_encoder
+
+
+def rerank_passages(query, passages, keep=RERANK_KEEP, mode=RERANK_MODE):
+    """
+    Re-order (chunk, score) passages and keep the best `keep`.
+
+    "cross-encoder" scores each (query, passage) pair with a cross-encoder; otherwise BM25
+    and the retrieval score are max-normalized and averaged (hybrid lexical + dense).
+    """
+    if not passages:
+        return passages
+    texts = [chunk["text"] for chunk, _ in passages]
+    model = get_cross_encoder() if mode == "cross-encoder" else None
+    if model is not None:
+        scores = np.asarray(model.predict([(query, text) for text in texts]), dtype=np.float32)
+    else:
+        lexical = bm25_scores(query, texts)
+        dense = np.maximum(np.array([score for _, score in passages], dtype=np.float32), 0.0)
+        scores = lexical / max(lexical.max(), 1e-9) + dense / max(dense.max(), 1e-9)
+    return [passages[i] for i in np.argsort(-scores, kind="stable")[:keep]]
+
+
+def summarize_passages(query, passages, embedder, max_sentences=4):
+    """
+    Extractive summary as a stream of VectaraRAG-style chunks: one {"context": ...}, then
+    {"answer": ...} pieces (a cited sentence each), then {"retrieval_confidence": ...}.
+
+    The sentences closest to the query are kept in passage order with [n] citations. The
+    retrieval confidence is the mean retrieval score of the cited passages; it is not a
+    factual consistency score and is reported under its own key.
+    """
+    yield {"context": [chunk for chunk, _ in passages]}
+    if not passages:
+        yield {"answer": "No relevant passages found in the corpus."}
+        yield {"retrieval_confidence": 0.0}
+        return
+
+    query_vector = embedder.embed([query])[0]
+    sentences = [(n, s) for n, (chunk, _) in enumerate(passages, 1) for s in split_sentences(chunk["text"])]
+    if not sentences:
+        sentences = [(n, chunk["text"]) for n, (chunk, _) in enumerate(passages, 1)]
+    similarity = embedder.embed([s for _, s in sentences]) @ query_vector
+    ranked = [i for i in np.argsort(-similarity)[:max_sentences] if similarity[i] >= 0.25 * similarity.max()]
+    chosen = sorted(ranked or [int(np.argmax(similarity))])
+    for position, i in enumerate(chosen):
+        yield {"answer": ("" if position == 0 else " ") + f"{sentences[i][1]} [{sentences[i][0]}]"}
+    cited = {sentences[i][0] for i in chosen}
+    yield {"retrieval_confidence": round(float(np.mean([max(passages[n - 1][1], 0.0) for n in cited])), 3)}
+
+
+def collect_stream(chunks, on_token=None):
+    """
+    Fold VectaraRAG-style stream chunks into the {summary, factual_consistency_score,
+    sources} dict returned by `run`, passing each answer piece to `on_token` as it arrives.
+    Extractive summaries carry `retrieval_confidence` in place of a factual consistency score.
+    """
+    summary, fcs, confidence, sources = [], "N/A", None, []
+    for chunk in chunks:
+        if chunk.get("answer"):
+            summary.append(chunk["answer"])
+            if on_token:
+                on_token(chunk["answer"])
+        if "fcs" in chunk:
+            fcs = chunk["fcs"]
+        if "retrieval_confidence" in chunk:
+            confidence = chunk["retrieval_confidence"]
+        for item in chunk.get("context") or []:
+            doc = item[0] if isinstance(item, tuple) else item
+            metadata = doc if isinstance(doc, dict) else getattr(doc, "metadata", {})
+            sources.append(metadata.get("source", ""))
+    result = {"summary": "".join(summary), "factual_consistency_score": fcs, "sources": sources}
+    if confidence is not None:
+        result["retrieval_confidence"] = confidence
+    return result
+
+
+class LocalRAG:
+    """
+    Offline stand-in for VectaraRAG with the same `run(query) -> JSON string` contract,
+    plus `stream(query)`; the summary comes from `summarize_passages`.
+    """
+
+    def __init__(self, store, embedder, top_k=5, max_sentences=4, rerank=RERANK_MODE):
+        self.store = store
+        self.embedder = embedder
+        self.top_k = top_k
+        self.max_sentences = max_sentences
+        self.rerank = rerank
+
+    def retrieve(self, query, k=None):
+        ids, scores = self.store.search(self.embedder.embed([query])[0], k or self.top_k)
+        return [(self.store.chunks[i], float(score)) for i, score in zip(ids, scores)]
+
+    def passages(self, query):
+        if not self.rerank:
+            return self.retrieve(query)
+        return rerank_passages(query, self.retrieve(query, RERANK_CANDIDATES), min(RERANK_KEEP, self.top_k), self.rerank)
+
+    def stream(self, query):
+        return summarize_passages(query, self.passages(query), self.embedder, self.max_sentences)
+
+    def run(self, query):
+        return json.dumps(collect_stream(self.stream(query)))
+
+
+class HostedRAG:
+    """
+    Hosted-corpus backend. Without reranking, `run` is VectaraRAG and `stream` is the
+    streaming `as_rag` chain. With reranking, a wider candidate set is fetched from
+    Vectara, re-scored locally and summarized extractively from the best few passages.
+    """
+
+    def __init__(self, rerank=RERANK_MODE):
+        self.vectara = Vectara(vectara_api_key=VECTARA_API_KEY)
+        self.rerank = rerank
+        self.embedder = HashingEmbedder()
+
+    def _config(self, limit, stream=False):
+        from langchain_vectara.vectorstores import CorpusConfig, GenerationConfig, SearchConfig, VectaraQueryConfig
+        return VectaraQueryConfig(
+            search=SearchConfig(corpora=[CorpusConfig(corpus_key=VECTARA_CORPUS_KEY)], limit=limit),
+            generation=GenerationConfig(max_used_search_results=5),
+            stream_response=stream,
+        )
+
+    def passages(self, query):
+        results = self.vectara.similarity_search_with_score(query, config=self._config(RERANK_CANDIDATES))
+        candidates = [(dict(doc.metadata, text=doc.page_content), float(score)) for doc, score in results]
+        return rerank_passages(query, candidates, RERANK_KEEP, self.rerank)
+
+    def stream(self, query):
+        if self.rerank:
+            return summarize_passages(query, self.passages(query), self.embedder)
+        return self.vectara.as_rag(self._config(10, stream=True)).stream(query)
+
+    def run(self, query):
+        if self.rerank:
+            return json.dumps(collect_stream(self.stream(query)))
+        return VectaraRAG(
+            name="rag-tool",
+            description="Get answers using RAG",
+            vectorstore=self.vectara,
+            corpus_key=VECTARA_CORPUS_KEY,
+        ).run(query)
+
+
+_local_rag = None
+_local_rag_lock = threading.Lock()
+
+
+def get_local_rag():
+    """Load (or build and save) the local index once per process."""
+    global _local_rag
+    with _local_rag_lock:
+        if _local_rag is None:
+            embedder = HashingEmbedder()
+            if os.path.exists(os.path.join(LOCAL_INDEX_DIR, "vectors.npy")):
+                store = LocalVectorStore.load(LOCAL_INDEX_DIR)
+            else:
+                store = build_local_store(LOCAL_CORPUS_DIR, embedder)
+                store.save(LOCAL_INDEX_DIR)
+            if store.ivf is None and len(store) >= IVF_MIN_CHUNKS:
+                store.train_ivfpq()
+                store.save_ivf(LOCAL_INDEX_DIR)
+            _local_rag = LocalRAG(store, embedder)
+    return _local_rag
+
+
+def get_rag_backend():
+    if RAG_BACKEND == "local":
+        return get_local_rag()
+    return HostedRAG()
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def prepare_document(path):
+    """Process-pool worker: hash, extract and chunk one file."""
+    chunks = chunk_text(extract_text(path))
+    return path, file_sha256(path), [(hashlib.sha256(c.encode("utf-8")).hexdigest(), c) for c in chunks]
+
+
+def load_manifest(path=INGEST_MANIFEST):
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {"files": {}}
+
+
+def save_manifest(manifest, path=INGEST_MANIFEST):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def vectara_uploader(corpus_key=VECTARA_CORPUS_KEY):
+    """
+    Upload function that pushes one batch of chunks to the hosted corpus.
+
+    Chunks are sent in one request per source file so every returned document id belongs
+    to a single file; the ids come back as `{source: [doc_id, ...]}`. `upload.delete(ids)`
+    removes earlier documents from the corpus.
+    """
+    vectara = Vectara(vectara_api_key=VECTARA_API_KEY)
+
+    def upload(texts, metadatas):
+        by_source = {}
+        for text, meta in zip(texts, metadatas):
+            group = by_source.setdefault(meta["source"], ([], []))
+            group[0].append(text)
+            group[1].append(meta)
+        return {source: list(vectara.add_texts(group_texts, metadatas=group_metas, corpus_key=corpus_key) or [])
+                for source, (group_texts, group_metas) in by_source.items()}
+
+    upload.delete = lambda ids: vectara.delete(list(ids), corpus_key=corpus_key)
+    return upload
+
+
+def local_uploader(index_dir=LOCAL_INDEX_DIR):
+    """Upload function that appends chunks to the local index; `upload.flush()` saves it."""
+    embedder = HashingEmbedder()
+    store = LocalVectorStore.load(index_dir) if os.path.exists(os.path.join(index_dir, "vectors.npy")) else LocalVectorStore(embedder.dim)
+    lock = threading.Lock()
+
+    def upload(texts, metadatas):
+        vectors = embedder.embed(texts)
+        chunks = [dict(meta, text=text, id=uuid.uuid4().hex) for text, meta in zip(texts, metadatas)]
+        with lock:
+            store.add(vectors, chunks)
+        ids = {}
+        for chunk in chunks:
+            ids.setdefault(chunk["source"], []).append(chunk["id"])
+        return ids
+
+    def delete(ids):
+        with lock:
+            store.remove(ids)
+
+    upload.delete = delete
+    upload.flush = lambda: store.save(index_dir)
+    return upload
+
+
+def upload_with_retries(upload, texts, metadatas, attempts=5, base_delay=0.5):
+    for attempt in range(attempts):
+        try:
+            return upload(texts, metadatas)
+        except Exception:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(base_delay * 2 ** attempt * (0.5 + random.random()))
+
+
+def ingest_directory(root, upload, manifest_path=INGEST_MANIFEST, workers=None,
+                     uploaders=4, batch_size=64, max_pending_batches=8):
+    """
+    Push every new or changed document under `root` to `upload(texts, metadatas)`.
+
+    Files are hashed, extracted and chunked in a process pool; chunks whose content hash
+    is already in the corpus are dropped; the rest are uploaded in batches by a few threads
+    with retries. The extraction pool only gets new files while the bounded upload queue
+    has room, so a slow backend throttles the whole pipeline instead of buffering it all.
+    A file is recorded in the manifest only after all of its chunks are uploaded.
+
+    The manifest keeps the document ids each file uploaded. A changed or deleted file has
+    those documents removed through `upload.delete(ids)` before anything is re-uploaded, and
+    unchanged files that relied on one of its chunks as a duplicate are re-ingested with it.
+    """
+    manifest = load_manifest(manifest_path)
+    known = manifest["files"]
+
+    paths, unchanged = [], set()
+    for folder, _, files in os.walk(root):
+        for name in sorted(files):
+            if not name.lower().endswith(DOCUMENT_EXTENSIONS):
+                continue
+            path = os.path.join(folder, name)
+            stat = os.stat(path)
+            entry = known.get(path)
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                unchanged.add(path)
+            else:
+                paths.append(path)
+
+    # Retire the documents of changed and deleted files before uploading anything new
+    changed = set(paths)
+    stale = [p for p in known if p in changed or not os.path.exists(p)]
+    while stale:
+        dropped = set()
+        for path in stale:
+            entry = known.pop(path)
+            dropped.update(entry.get("uploaded", ()))
+            if entry.get("doc_ids") and hasattr(upload, "delete"):
+                upload.delete(entry["doc_ids"])
+        stale = [p for p in unchanged if dropped.intersection(known[p]["chunks"])]
+        unchanged.difference_update(stale)
+        paths.extend(stale)
+    seen_chunks = {h for entry in known.values() for h in entry.get("uploaded", entry["chunks"])}
+
+    stats = {"documents": 0, "unchanged": len(unchanged), "chunks": 0, "duplicates": 0, "failed": 0}
+    batches = queue.Queue(maxsize=max_pending_batches)
+    lock = threading.Lock()
+    pending = {}
+
+    def finish(path):
+        stat = os.stat(path)
+        known[path] = dict(pending.pop(path)["entry"], size=stat.st_size, mtime=stat.st_mtime)
+        stats["documents"] += 1
+
+    def upload_worker():
+        while True:
+            batch = batches.get()
+            if batch is None:
+                return
+            texts = [text for _, _, text in batch]
+            metadatas = [{"source": path, "chunk_hash": h} for path, h, _ in batch]
+            try:
+                doc_ids = upload_with_retries(upload, texts, metadatas) or {}
+                failed = False
+            except Exception as e:
+                print(f"⚠️  Upload failed after retries: {e}")
+                doc_ids, failed = {}, True
+            orphaned = []
+            with lock:
+                for path in {path for path, _, _ in batch}:
+                    pending[path]["entry"]["doc_ids"].extend(doc_ids.get(path, ()))
+                for path, _, _ in batch:
+                    state = pending[path]
+                    state["failed"] |= failed
+                    state["remaining"] -= 1
+                    if state["remaining"] == 0:
+                        if state["failed"]:
+                            orphaned.extend(pending.pop(path)["entry"]["doc_ids"])
+                            stats["failed"] += 1
+                        else:
+                            finish(path)
+            # A file that failed part-way is retried from scratch next run, so drop what did land
+            if orphaned and hasattr(upload, "delete"):
+                upload.delete(orphaned)
+
+    threads = [threading.Thread(target=upload_worker, daemon=True) for _ in range(uploaders)]
+    for thread in threads:
+        thread.start()
+
+    started = time.perf_counter()
+    buffer = []
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        remaining, in_flight = iter(paths), set()
+        while True:
+            for path in remaining:
+                in_flight.add(pool.submit(prepare_document, path))
+                if len(in_flight) >= workers * 2:
+                    break
+            if not in_flight:
+                break
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    path, file_hash, chunks = future.result()
+                except Exception as e:
+                    print(f"⚠️  Could not process document: {e}")
+                    stats["failed"] += 1
+                    continue
+                new_chunks = []
+                for chunk_hash, text in chunks:
+                    if chunk_hash in seen_chunks:
+                        stats["duplicates"] += 1
+                    else:
+                        seen_chunks.add(chunk_hash)
+                        new_chunks.append((path, chunk_hash, text))
+                entry = {"sha256": file_hash, "chunks": [h for h, _ in chunks],
+                         "uploaded": [h for _, h, _ in new_chunks], "doc_ids": []}
+                with lock:
+                    pending[path] = {"entry": entry, "remaining": len(new_chunks), "failed": False}
+                    if not new_chunks:
+                        finish(path)
+                stats["chunks"] += len(new_chunks)
+                buffer.extend(new_chunks)
+                while len(buffer) >= batch_size:
+                    batches.put(buffer[:batch_size])
+                    buffer = buffer[batch_size:]
+    if buffer:
+        batches.put(buffer)
+    for _ in threads:
+        batches.put(None)
+    for thread in threads:
+        thread.join()
+    if hasattr(upload, "flush"):
+        upload.flush()
+    save_manifest(manifest, manifest_path)
+    stats["seconds"] = time.perf_counter() - started
+    stats["docs_per_sec"] = stats["documents"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+
 @tool("Vectara RAG Search")
 def vectara_rag_search(query: str) -> str:
     """
     Args:
         query: Question or topic to research using your private corpus
     Returns:
-        Generated answer with factual consistency score
+        Generated answer with factual consistency score (or retrieval confidence for extractive summaries)
     """
     try:
-        vectara = Vectara(vectara_api_key=VECTARA_API_KEY)
-        
-        vectara_rag_tool = VectaraRAG(
-            name="rag-tool",
-            description="Get answers using RAG",
-            vectorstore=vectara,
-            corpus_key=VECTARA_CORPUS_KEY,
-        )
+        vectara_rag_tool = get_rag_backend()
         
-        result = vectara_rag_tool.run(query)
+        if STREAM_ANSWERS:
+            print("**Answer (streaming):** ", end="", flush=True)
+            result = json.dumps(collect_stream(
+                vectara_rag_tool.stream(query),
+                on_token=lambda token: print(token, end="", flush=True)
+            ))
+            print()
+        else:
+            result = vectara_rag_tool.run(query)
         
         try:
             result_dict = json.loads(result)
             summary = result_dict.get("summary", result)
             fcs = result_dict.get("factual_consistency_score", "N/A")
+            confidence = result_dict.get("retrieval_confidence")
             
             formatted_result = f"**Answer:** {summary}\n\n"
             if fcs != "N/A":
                 formatted_result += f"**Factual Consistency Score:** {fcs}\n"
                 formatted_result += "(Higher scores indicate higher confidence in factual accuracy)"
+            elif confidence is not None:
+                formatted_result += f"**Retrieval Confidence:** {confidence}\n"
+                formatted_result += "(Mean retrieval score of the cited passages, not a factual accuracy check)"
             
             return formatted_result
         except (json.JSONDecodeError, TypeError):
@@ -87,7 +848,7 @@ def create_rag_task(query="What are the key benefits of using AI?"):
         expected_output=(
             f"A comprehensive answer to '{query}' including:\n"
             "- Main response based on corpus information\n"
-            "- Factual consistency score if available\n"
+            "- Factual consistency score (or retrieval confidence) if available\n"
             "- Clear, well-structured information"
         ),
         agent=None
@@ -108,24 +869,25 @@ def main():
         print("⚠️  Please set your GEMINI_API_KEY environment variable")
         return
     
-    if not VECTARA_API_KEY:
-        print("⚠️  Please set your VECTARA_API_KEY environment variable")
-        print("Get your API key from: https://vectara.com/")
-        return
+    if RAG_BACKEND != "local":
+        if not VECTARA_API_KEY:
+            print("⚠️  Please set your VECTARA_API_KEY environment variable")
+            print("Get your API key from: https://vectara.com/")
+            return
     
-    if not VECTARA_CORPUS_KEY:
-        print("⚠️  Please set your VECTARA_CORPUS_KEY environment variable")
-        print("This identifies your specific corpus in Vectara")
-        return
+        if not VECTARA_CORPUS_KEY:
+            print("⚠️  Please set your VECTARA_CORPUS_KEY environment variable")
+            print("This identifies your specific corpus in Vectara")
+            return
     
-    missing_deps = check_dependencies()
-    if missing_deps:
-        print("⚠️  Missing required dependencies:")
-        for dep in missing_deps:
-            print(f"   - {dep}")
-        print("\nTo install missing dependencies, run:")
-        print("pip install langchain-vectara")
-        return
+        missing_deps = check_dependencies()
+        if missing_deps:
+            print("⚠️  Missing required dependencies:")
+            for dep in missing_deps:
+                print(f"   - {dep}")
+            print("\nTo install missing dependencies, run:")
+            print("pip install langchain-vectara")
+            return
     
     print("🚀 Starting Vectara RAG Test with Gemini 2.5 Flash...")
     
@@ -158,9 +920,181 @@ def main():
     print("🎯 VECTARA RAG RESULTS")
     print(result)
         
+def synthetic_vectors(n, dim, seed=0):
+    """
+    Clustered unit vectors that stand in for embedded chunks at benchmark scale: ~100
+    points per topic with varying spread, so nearest neighbours are not near-ties.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(n // 100, 10), dim)).astype(np.float32)
+    out = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 100_000):
+        size = min(100_000, n - start)
+        spread = rng.uniform(0.2, 0.8, (size, 1)).astype(np.float32)
+        rows = centers[rng.integers(0, len(centers), size)] + spread * rng.standard_normal((size, dim)).astype(np.float32)
+        out[start:start + size] = rows / np.linalg.norm(rows, axis=1, keepdims=True)
+    return out
+
+
+def benchmark_local_index(n_chunks=200_000, n_queries=100, k=10, dim=EMBEDDING_DIM):
+    """Recall@k and per-query latency of IVF-PQ against exact float16/int8 search."""
+    print(f"Generating {n_chunks:,} synthetic {dim}-d vectors...")
+    vectors = synthetic_vectors(n_chunks, dim)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(n_chunks, n_queries, replace=False)] + 0.05 * rng.standard_normal((n_queries, dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    chunks = [None] * n_chunks
+
+    truth = None
+    for dtype in ("float16", "int8"):
+        store = LocalVectorStore(dim, dtype)
+        store.add(vectors, chunks)
+        started = time.perf_counter()
+        results = [store.search_exact(q, k)[0] for q in queries]
+        elapsed = (time.perf_counter() - started) / n_queries * 1000
+        if truth is None:
+            truth = results
+        recall = np.mean([len(set(r) & set(t)) / k for r, t in zip(results, truth)])
+        print(f"exact {dtype:8s}: {store.vectors.nbytes / 2**20:8.1f} MB  {elapsed:8.2f} ms/query  recall@{k} {recall:.3f}")
+
+    store = LocalVectorStore(dim, "float16")
+    store.add(vectors, chunks)
+    started = time.perf_counter()
+    store.train_ivfpq()
+    print(f"IVF-PQ trained in {time.perf_counter() - started:.1f}s "
+          f"({len(store.ivf['coarse'])} lists, codes {store.ivf['codes'].nbytes / 2**20:.1f} MB)")
+    for nprobe in (4, 16, 64):
+        started = time.perf_counter()
+        results = [store.search_ivfpq(q, k, nprobe=nprobe)[0] for q in queries]
+        elapsed = (time.perf_counter() - started) / n_queries * 1000
+        recall = np.mean([len(set(r) & set(t)) / k for r, t in zip(results, truth)])
+        print(f"ivfpq nprobe={nprobe:<3d}: {elapsed:8.2f} ms/query  recall@{k} {recall:.3f}")
+
+def write_synthetic_documents(directory, n_docs, seed=0):
+    """Mixed Markdown/HTML/text files with some repeated boilerplate paragraphs."""
+    rng = random.Random(seed)
+    words = ("vector index corpus retrieval latency throughput embedding chunk query answer model "
+             "document policy revenue customer support release feature benchmark cache").split()
+    boilerplate = [" ".join(rng.choice(words) for _ in range(60)) + "." for _ in range(20)]
+    os.makedirs(directory, exist_ok=True)
+    for i in range(n_docs):
+        paragraphs = [" ".join(rng.choice(words) for _ in range(rng.randint(80, 200))) + "." for _ in range(6)]
+        paragraphs.append(rng.choice(boilerplate))
+        ext = (".md", ".html", ".txt")[i % 3]
+        body = "\n\n".join(paragraphs)
+        if ext == ".html":
+            body = f"<html><head><style>p{{}}</style></head><body><p>{body}</p></body></html>"
+        elif ext == ".md":
+            body = f"# Document {i}\n\n{body}"
+        with open(os.path.join(directory, f"doc_{i:05d}{ext}"), "w", encoding="utf-8") as f:
+            f.write(body)
+
+
+def benchmark_ingestion(n_docs=2000, batch_latency=0.05):
+    """Docs/sec through the pipeline against a stub uploader that sleeps per batch."""
+    import shutil
+    bench_dir = ".vectara_bench"
+    docs_dir = os.path.join(bench_dir, "docs")
+    shutil.rmtree(bench_dir, ignore_errors=True)
+    write_synthetic_documents(docs_dir, n_docs)
+
+    uploaded, corpus = [], {}
+
+    def stub_upload(texts, metadatas):
+        time.sleep(batch_latency)
+        uploaded.append(len(texts))
+        ids = {}
+        for text, meta in zip(texts, metadatas):
+            doc_id = uuid.uuid4().hex
+            corpus[doc_id] = text
+            ids.setdefault(meta["source"], []).append(doc_id)
+        return ids
+
+    def stub_delete(ids):
+        for doc_id in ids:
+            corpus.pop(doc_id, None)
+
+    stub_upload.delete = stub_delete
+
+    print(f"Ingesting {n_docs} documents (stub upload latency {batch_latency * 1000:.0f} ms/batch)")
+    for label, workers, uploaders in (("serial", 1, 1), ("parallel", None, 4)):
+        manifest_path = os.path.join(bench_dir, f"manifest_{label}.json")
+        uploaded.clear()
+        corpus.clear()
+        stats = ingest_directory(docs_dir, stub_upload, manifest_path, workers=workers, uploaders=uploaders)
+        print(f"{label:8s}: {stats['docs_per_sec']:8.1f} docs/sec  {stats['chunks']} chunks in "
+              f"{len(uploaded)} batches, {stats['duplicates']} duplicate chunks skipped")
+    stats = ingest_directory(docs_dir, stub_upload, manifest_path)
+    print(f"re-run  : {stats['unchanged']} unchanged files skipped in {stats['seconds']:.2f}s")
+
+    # Edit one file and then revert it: the corpus must end up exactly where it started
+    before = sorted(corpus.values())
+    path = os.path.join(docs_dir, sorted(os.listdir(docs_dir))[0])
+    with open(path, encoding="utf-8") as f:
+        original = f.read()
+    for label, body in (("edited", original + "\nA freshly appended closing paragraph about returns."), ("reverted", original)):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(body)
+        stats = ingest_directory(docs_dir, stub_upload, manifest_path)
+        print(f"{label:8s}: {stats['documents']} documents re-ingested, corpus holds {len(corpus)} chunks")
+    texts = sorted(corpus.values())
+    print(f"corpus after revert matches original: {texts == before}  "
+          f"duplicate chunks: {len(texts) - len(set(texts))}")
+    shutil.rmtree(bench_dir, ignore_errors=True)
+
+def benchmark_rerank(n_docs=2000, n_queries=200, seed=0):
+    """
+    Answer hit rate, passage tokens handed to the summarizer, blocking latency and
+    time-to-first-token for the local backend with and without BM25 reranking.
+    """
+    rng = random.Random(seed)
+    vocabulary = ("device battery charging cable pricing discount delivery support chat email manual "
+                  "setup cleaning storage replacement repair shipping order account return policy "
+                  "firmware update screen sensor warranty coverage claim store customer").split()
+    names = [f"model{i:05d}" for i in range(n_docs)]
+    embedder = HashingEmbedder()
+    chunks = []
+    for i, name in enumerate(names):
+        sentences = [f"The {' '.join(rng.choice(vocabulary) for _ in range(12))}." for _ in range(4)]
+        sentences.insert(rng.randint(0, 4), f"The {name} warranty lasts {i % 9 + 1} years.")
+        chunks.append({"text": " ".join(sentences), "source": f"doc_{i}"})
+    store = LocalVectorStore(embedder.dim)
+    store.add(embedder.embed([c["text"] for c in chunks]), chunks)
+    queries = [(f"How many years does the {name} warranty last?", f"{name} warranty lasts")
+               for name in rng.sample(names, min(n_queries, n_docs))]
+
+    print(f"{len(chunks)} chunks, {len(queries)} queries")
+    for label, rerank in (("top-5", ""), ("bm25 20->3", "bm25")):
+        rag = LocalRAG(store, embedder, rerank=rerank)
+        hits, tokens, blocking, first = 0, 0, 0.0, 0.0
+        for query, answer in queries:
+            tokens += sum(len(chunk["text"]) // 4 for chunk, _ in rag.passages(query))
+            started = time.perf_counter()
+            hits += answer in json.loads(rag.run(query))["summary"]
+            blocking += time.perf_counter() - started
+            started = time.perf_counter()
+            next(chunk for chunk in rag.stream(query) if "answer" in chunk)
+            first += time.perf_counter() - started
+        n = len(queries)
+        print(f"{label:11s}: hit rate {hits / n:.2f}  summarizer tokens/query {tokens / n:6.0f}  "
+              f"blocking {blocking / n * 1000:6.2f} ms  first token {first / n * 1000:6.2f} ms")
+
 def run():
     """Alternative entry point for crewai run command"""
     main()
 
 if __name__ == "__main__":
-    main()
+    if "--ingest" in sys.argv:
+        directory = sys.argv[sys.argv.index("--ingest") + 1]
+        upload = local_uploader() if RAG_BACKEND == "local" else vectara_uploader()
+        print(ingest_directory(directory, upload))
+    elif "--benchmark-ingest" in sys.argv:
+        args = sys.argv[sys.argv.index("--benchmark-ingest") + 1:]
+        benchmark_ingestion(int(args[0]) if args else 2000)
+    elif "--benchmark-rerank" in sys.argv:
+        benchmark_rerank()
+    elif "--benchmark" in sys.argv:
+        args = sys.argv[sys.argv.index("--benchmark") + 1:]
+        benchmark_local_index(int(args[0]) if args else 200_000)
+    else:
+        main()
@@ -1,4 +1,9 @@
 import os
+import re
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from dotenv import load_dotenv
 
 from crewai import Agent, Task, Crew, LLM
@@ -21,6 +26,105 @@ def setup_gemini_llm():
     )
 
 
+CHARS_PER_TOKEN = 4
+SIMHASH_MAX_DISTANCE = 6
+# Shorter texts have too few shingles for a meaningful fingerprint (empty text hashes to 0)
+SIMHASH_MIN_WORDS = 8
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|gclid|fbclid|msclkid|ref|ref_src|mc_cid|mc_eid)$", re.IGNORECASE)
+
+_api_wrapper = None
+_api_wrapper_lock = threading.Lock()
+
+
+def get_api_wrapper():
+    """Shared You.com API wrapper, created on first use."""
+    global _api_wrapper
+    with _api_wrapper_lock:
+        if _api_wrapper is None:
+            _api_wrapper = YouSearchAPIWrapper(
+                ydc_api_key=YDC_API_KEY,
+                num_web_results=5
+            )
+    return _api_wrapper
+
+
+def canonical_url(url):
+    """Normalize a URL so trivially different links to the same page compare equal."""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if not TRACKING_PARAMS.match(k)))
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("https" if parts.scheme in ("http", "https") else parts.scheme, host, path, query, ""))
+
+
+def simhash(text, shingle_size=2):
+    """64-bit SimHash over word shingles; near-duplicate texts differ in only a few bits."""
+    words = re.findall(r"\w+", text.lower())
+    shingles = [" ".join(words[i:i + shingle_size]) for i in range(max(len(words) - shingle_size + 1, 1))]
+    weights = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def dedupe_results(result_lists):
+    """
+    Merge ranked result lists, dropping repeated canonical URLs and near-duplicate content.
+
+    Returns:
+        List of dicts (title, url, description, content, hits, best_rank) ordered by how
+        many queries returned the page and then by its best rank
+    """
+    merged, fingerprints = {}, []
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            url = doc.metadata.get('url', '')
+            key = canonical_url(url) if url else doc.page_content[:100]
+            if key not in merged:
+                text = doc.page_content or doc.metadata.get('description', '')
+                duplicate_of = None
+                if len(re.findall(r"\w+", text)) >= SIMHASH_MIN_WORDS:
+                    fingerprint = simhash(text)
+                    duplicate_of = next((k for k, f in fingerprints if bin(f ^ fingerprint).count("1") <= SIMHASH_MAX_DISTANCE), None)
+                    if duplicate_of is None:
+                        fingerprints.append((key, fingerprint))
+                if duplicate_of is not None:
+                    key = duplicate_of
+                else:
+                    merged[key] = {
+                        'title': doc.metadata.get('title', 'No title'),
+                        'url': url or 'No URL',
+                        'description': doc.metadata.get('description', ''),
+                        'content': doc.page_content,
+                        'hits': 0,
+                        'best_rank': rank,
+                    }
+            merged[key]['hits'] += 1
+            merged[key]['best_rank'] = min(merged[key]['best_rank'], rank)
+    return sorted(merged.values(), key=lambda r: (-r['hits'], r['best_rank']))
+
+
+def format_results(results, token_budget):
+    """Compact listing that fits in roughly `token_budget` tokens, splitting the space evenly."""
+    budget = token_budget * CHARS_PER_TOKEN
+    lines = []
+    for i, result in enumerate(results):
+        header = f"[{i + 1}] {result['title']} - {result['url']}"
+        share = budget // (len(results) - i) - len(header) - 1
+        if share < 0 and lines:
+            break
+        text = " ".join((result['description'] or result['content']).split())
+        snippet = text if len(text) <= share else text[:max(share - 3, 0)].rsplit(" ", 1)[0] + "..."
+        entry = header + ("\n" + snippet if snippet.strip(".") else "")
+        lines.append(entry)
+        budget -= len(entry) + 1
+    return "\n".join(lines)
+
+
 @tool("You.com Web Search")
 def search_you_com(query: str) -> str:
     """
@@ -32,25 +136,11 @@ def search_you_com(query: str) -> str:
         String containing search results with URLs, titles, and snippets
     """
     try:
-        api_wrapper = YouSearchAPIWrapper(
-            ydc_api_key=YDC_API_KEY,
-            num_web_results=5
-        )
-
-        you_tool = YouSearchTool(api_wrapper=api_wrapper)
+        you_tool = YouSearchTool(api_wrapper=get_api_wrapper())
         results = you_tool.invoke(query)
 
         if isinstance(results, list):
-            formatted_results = []
-            for i, doc in enumerate(results, 1):
-                formatted_results.append(f"""
-                Result {i}:
-                Title: {doc.metadata.get('title', 'No title')}
-                URL: {doc.metadata.get('url', 'No URL')}
-                Description: {doc.metadata.get('description', 'No description')}
-                Content: {doc.page_content[:200]}...
-                """)
-            return "\n".join(formatted_results)
+            return format_results(dedupe_results([results]), token_budget=400)
         else:
             return str(results)
 
@@ -58,6 +148,30 @@ def search_you_com(query: str) -> str:
         return f"Error searching You.com: {str(e)}"
 
 
+@tool("You.com Multi-Query Web Search")
+def search_you_com_batch(queries: list, token_budget: int = 1500) -> str:
+    """
+    Run several paraphrases of a search at once and return one merged, de-duplicated result list.
+
+    Args:
+        queries: List of search queries (e.g. paraphrases of the same question)
+        token_budget: Approximate maximum size of the returned text in tokens (default 1500)
+    Returns:
+        String containing the merged results with URLs, titles, and snippets
+    """
+    try:
+        unique_queries = list(dict.fromkeys(" ".join(str(q).split()) for q in queries if str(q).strip()))
+        if not unique_queries:
+            return "Error: No search queries provided."
+        api_wrapper = get_api_wrapper()
+        with ThreadPoolExecutor(max_workers=min(len(unique_queries), 10)) as pool:
+            result_lists = list(pool.map(api_wrapper.results, unique_queries))
+        return format_results(dedupe_results(result_lists), token_budget)
+
+    except Exception as e:
+        return f"Error searching You.com: {str(e)}"
+
+
 def create_web_researcher(llm):
     return Agent(
         role="Web Research Specialist",
@@ -68,7 +182,7 @@ def create_web_researcher(llm):
             "You.com's powerful search capabilities to ground responses in factual, "
             "up-to-date data that may not be in training datasets."
         ),
-        tools=[search_you_com],
+        tools=[search_you_com, search_you_com_batch],
         llm=llm,
         verbose=True,
         allow_delegation=False
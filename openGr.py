@@ -1,4 +1,8 @@
 import os
+import re
+import sys
+import math
+import threading
 import requests
 import json
 from langchain_ollama import OllamaLLM
@@ -10,6 +14,105 @@ from textwrap import dedent
 # -----------------------------------------------------------
 # 1. TOOL DEFINITION (FUNCTION-BASED)
 # -----------------------------------------------------------
+# The toolkit is built once per process and kept warm. Tool selection uses an
+# inverted index over each tool's name, description and argument schema that is
+# built together with the toolkit, so routing a query is a handful of dict lookups.
+# Tool names are verb_object ("get_dataset", "summarize"); the leading verb says what the
+# tool does, so it outranks the object nouns that several tools share.
+NAME_VERB_WEIGHT = 4.0
+NAME_WEIGHT = 3.0
+ARG_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+STOP_WORDS = {"a", "an", "the", "of", "for", "to", "in", "on", "and", "or", "with", "by", "is", "are", "this", "that", "it", "use", "tool", "named", "called"}
+
+
+def tokenize(text):
+    """Lower-cased word stems; snake_case and camelCase identifiers are split into words."""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(text)).replace("_", " ").lower()
+    stems = []
+    for word in re.findall(r"[a-z0-9]+", text):
+        if word in STOP_WORDS:
+            continue
+        # -ize/-ise and -y/-ies forms share a stem: summarize, summarise, summary -> summar
+        for suffix in ("ization", "isation", "izing", "ising", "ized", "ised", "ize", "ise", "ies", "ing", "ed", "es", "s", "y"):
+            if len(word) > len(suffix) + 3 and word.endswith(suffix):
+                word = word[: -len(suffix)]
+                break
+        stems.append(word)
+    return stems
+
+
+class ToolRouter:
+    """Precomputed term index that scores a query against every tool of a toolkit."""
+
+    def __init__(self, tools):
+        self.tools = list(tools)
+        term_weights = []
+        for t in self.tools:
+            weights = {}
+            for i, term in enumerate(tokenize(t.name)):
+                weights[term] = max(weights.get(term, 0.0), NAME_VERB_WEIGHT if i == 0 else NAME_WEIGHT)
+            fields = [(t.description, DESCRIPTION_WEIGHT)]
+            for arg_name, arg_schema in (getattr(t, "args", None) or {}).items():
+                fields.append((arg_name, ARG_WEIGHT))
+                fields.append((arg_schema.get("description", ""), DESCRIPTION_WEIGHT))
+            for text, weight in fields:
+                for term in tokenize(text):
+                    weights[term] = max(weights.get(term, 0.0), weight)
+            term_weights.append(weights)
+        # Terms shared by every tool cannot tell them apart, so they are weighted by rarity.
+        document_frequency = {}
+        for weights in term_weights:
+            for term in weights:
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+        self.index = {}
+        for position, weights in enumerate(term_weights):
+            for term, weight in weights.items():
+                rarity = math.log(1 + len(self.tools) / document_frequency[term])
+                self.index.setdefault(term, []).append((position, weight * rarity))
+
+    def scores(self, query):
+        """Per tool: (total score, weight of its strongest matching term)."""
+        totals = [0.0] * len(self.tools)
+        strongest = [0.0] * len(self.tools)
+        for term in set(tokenize(query)):
+            for position, weight in self.index.get(term, ()):
+                totals[position] += weight
+                strongest[position] = max(strongest[position], weight)
+        return list(zip(totals, strongest))
+
+    def route(self, query):
+        """
+        Best matching tool, or None when the query shares no terms with any tool. Equal
+        totals go to the tool with the more specific single match (e.g. its name verb).
+        """
+        if len(self.tools) == 1:
+            return self.tools[0]
+        scores = self.scores(query)
+        best = max(range(len(scores)), key=lambda i: (round(scores[i][0], 9), scores[i][1]))
+        return self.tools[best] if scores[best][0] > 0 else None
+
+
+_toolkit_lock = threading.Lock()
+_tool_router = None
+
+
+def get_tool_router():
+    """Build the OpenGradient toolkit and its router on first use, then reuse them."""
+    global _tool_router
+    if _tool_router is None:
+        with _toolkit_lock:
+            if _tool_router is None:
+                print("Initializing OpenGradient Toolkit...")
+                # We will use the mistral model for the toolkit's LLM
+                llm = OllamaLLM(model="mistral")
+                opengradient_toolkit = OpenGradientToolkit.from_llm(llm=llm)
+                if not opengradient_toolkit or not opengradient_toolkit.get_tools():
+                    raise RuntimeError("OpenGradient Toolkit could not be initialized or contains no tools.")
+                _tool_router = ToolRouter(opengradient_toolkit.get_tools())
+    return _tool_router
+
+
 @tool("OpenGradient Tool")
 def opengradient_tool(query: str) -> str:
     """
@@ -18,29 +121,11 @@ def opengradient_tool(query: str) -> str:
     retrieving and summarizing datasets.
     """
     try:
-        print(f"Initializing OpenGradient Toolkit with query: '{query}'")
-        
-        # We will use the mistral model for the toolkit's LLM
-        llm = OllamaLLM(model="mistral")
-        
-        # Instantiate the toolkit from the LLM
-        opengradient_toolkit = OpenGradientToolkit.from_llm(llm=llm)
-        
-        if not opengradient_toolkit or not opengradient_toolkit.get_tools():
-            return "Error: OpenGradient Toolkit could not be initialized or contains no tools."
-            
-        # The OpenGradient toolkit returns a list of tools.
-        # We will iterate and find the most relevant tool for the query
-        # For simplicity, we'll try to find a 'get_dataset' or 'summarize' tool
-        available_tools = opengradient_toolkit.get_tools()
-        tool_to_use = None
-        
-        # Simple logic to select a tool based on the query,
-        # otherwise default to the first tool.
-        if "summarize" in query.lower():
-            tool_to_use = next((t for t in available_tools if "summarize" in t.name), available_tools[0])
-        else:
-            tool_to_use = next((t for t in available_tools if "dataset" in t.name), available_tools[0])
+        router = get_tool_router()
+        tool_to_use = router.route(query)
+        if tool_to_use is None:
+            names = ", ".join(t.name for t in router.tools)
+            return f"No OpenGradient tool matches '{query}'. Rephrase the query for one of: {names}."
 
         print(f"Selected tool to use: {tool_to_use.name}")
         
@@ -109,7 +194,36 @@ opengradient_crew = Crew(
 # -----------------------------------------------------------
 # 6. EXECUTION AND TESTING
 # -----------------------------------------------------------
-if __name__ == "__main__":
+def run_routing_checks():
+    """Known-answer routing checks against stand-ins for the toolkit's dataset tools."""
+    from types import SimpleNamespace
+    router = ToolRouter([
+        SimpleNamespace(name="get_dataset", description="Get a dataset by name and return its metadata.",
+                        args={"dataset_name": {"description": "Name of the dataset"}}),
+        SimpleNamespace(name="summarize", description="Summarize a dataset: size, purpose and key characteristics.",
+                        args={"dataset_name": {"description": "Name of the dataset"}}),
+    ])
+    checks = [
+        ("summarize this dataset", "summarize"),
+        ("give me a summary of the iris dataset", "summarize"),
+        ("Summarise the dataset named 'cifar10'.", "summarize"),
+        ("find the dataset named 'imagenet' and provide a summary of it", "summarize"),
+        ("get the dataset named 'mnist'", "get_dataset"),
+        ("fetch dataset mnist metadata", "get_dataset"),
+    ]
+    failures = 0
+    for query, want in checks:
+        picked = router.route(query)
+        got = picked.name if picked else None
+        ok = got == want
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {query!r}: got {got!r}, expected {want!r}")
+    return failures
+
+
+if __name__ == "__main__" and "--check" in sys.argv:
+    sys.exit(1 if run_routing_checks() else 0)
+elif __name__ == "__main__":
     print("## Starting the OpenGradient API Crew")
     result = opengradient_crew.kickoff()
     print("\n\n################################################")
@@ -1,7 +1,14 @@
 import os
+import sys
+import json
+import time
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 from langchain_ollama import OllamaLLM
-from langchain_oxylabs import OxylabsSearchAPIWrapper
 from crewai.tools import tool
 from crewai import Agent, Task, Crew, Process, LLM
 from textwrap import dedent
@@ -10,8 +17,216 @@ from typing import Optional
 # This line loads the environment variables from the .env file
 load_dotenv()
 
+REALTIME_URL = "https://realtime.oxylabs.io/v1"
+DATA_URL = "https://data.oxylabs.io/v1"
+# "realtime" sends one concurrent request per query; "batch" submits push-pull jobs and polls them
+OXYLABS_MODE = os.getenv("OXYLABS_MODE", "batch")
+OXYLABS_GEO = os.getenv("OXYLABS_GEO_LOCATION", "")
+OXYLABS_LOCALE = os.getenv("OXYLABS_LOCALE", "")
+MAX_WORKERS = int(os.getenv("OXYLABS_MAX_WORKERS", "32"))
+SERP_CACHE_TTL = float(os.getenv("OXYLABS_CACHE_TTL", "900"))
+SERP_CACHE_MAX_ENTRIES = int(os.getenv("OXYLABS_CACHE_MAX_ENTRIES", "5000"))
+BATCH_SIZE = 1000
+POLL_INTERVAL = 1.0
+JOB_TIMEOUT = 120
+RESULTS_PER_QUERY = 10
+
+# -----------------------------------------------------------
+# 1. SCRAPING CLIENT
+# -----------------------------------------------------------
+_serp_cache = {}  # insertion order is fetch order, so the oldest entries come first
+_serp_lock = threading.Lock()
+
+
+def cache_key(query, geo_location, locale):
+    return (" ".join(query.lower().split()), geo_location, locale)
+
+
+def store_serp(key, now, serp):
+    """Cache one SERP, dropping expired entries and the oldest beyond SERP_CACHE_MAX_ENTRIES. Hold _serp_lock."""
+    _serp_cache.pop(key, None)
+    _serp_cache[key] = (now, serp)
+    for old in list(_serp_cache):
+        if len(_serp_cache) <= SERP_CACHE_MAX_ENTRIES and now - _serp_cache[old][0] < SERP_CACHE_TTL:
+            break
+        del _serp_cache[old]
+
+
+def parse_serp(content):
+    """Organic results of a parsed google_search job as a list of {title, url, desc}."""
+    results = (content or {}).get("results") or {}
+    return [
+        {"title": item.get("title", ""), "url": item.get("url", ""), "desc": item.get("desc", "")}
+        for item in results.get("organic", [])
+    ]
+
+
+def format_serp(query, serp, limit=RESULTS_PER_QUERY):
+    if isinstance(serp, str):
+        return f"Query: {query}\n{serp}"
+    if not serp:
+        return f"Query: {query}\nNo results found."
+    lines = [f"Query: {query}"]
+    for item in serp[:limit]:
+        lines.append(f"Title: {item['title']}\nURL: {item['url']}\nDescription: {item['desc']}")
+    return "\n".join(lines)
+
+
+class OxylabsClient:
+    """
+    Oxylabs Web Scraper API client for many google_search queries at once.
+
+    One authenticated requests.Session with a connection pool sized to `max_workers` is
+    reused for every call. In "realtime" mode each query is a request on the shared
+    pool; in "batch" mode queries are submitted as push-pull batch jobs whose status is
+    polled and whose results are collected concurrently. A single uncached query always
+    goes through realtime, since a batch job costs at least one polling interval. Parsed
+    SERPs are cached by (query, geo_location, locale) for SERP_CACHE_TTL seconds.
+
+    Status and read errors are only retried for idempotent requests (the GET polls);
+    the billed POSTs are retried only when the connection failed before sending.
+    """
+
+    def __init__(self, username, password, realtime_url=REALTIME_URL, data_url=DATA_URL, mode=OXYLABS_MODE,
+                 max_workers=MAX_WORKERS, poll_interval=POLL_INTERVAL, job_timeout=JOB_TIMEOUT):
+        self.realtime_url = realtime_url
+        self.data_url = data_url
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.job_timeout = job_timeout
+        self.session = requests.Session()
+        self.session.auth = (username, password)
+        retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=retries)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    @staticmethod
+    def _payload(geo_location, locale):
+        payload = {"source": "google_search", "parse": True}
+        if geo_location:
+            payload["geo_location"] = geo_location
+        if locale:
+            payload["locale"] = locale
+        return payload
+
+    def _search_realtime(self, query, geo_location, locale):
+        try:
+            payload = dict(self._payload(geo_location, locale), query=query)
+            response = self.session.post(f"{self.realtime_url}/queries", json=payload, timeout=self.job_timeout)
+            response.raise_for_status()
+            return parse_serp(response.json()["results"][0]["content"])
+        except Exception as e:
+            return f"Error: {str(e)}"
+
+    def _submit_batch(self, queries, geo_location, locale):
+        payload = dict(self._payload(geo_location, locale), query=queries)
+        response = self.session.post(f"{self.data_url}/queries/batch", json=payload, timeout=60)
+        response.raise_for_status()
+        return [job["id"] for job in response.json()["queries"]]
+
+    def _job_status(self, job_id):
+        try:
+            response = self.session.get(f"{self.data_url}/queries/{job_id}", timeout=30)
+            response.raise_for_status()
+            return response.json().get("status", "pending")
+        except requests.RequestException:
+            return "pending"
+
+    def _job_results(self, job_id):
+        try:
+            response = self.session.get(f"{self.data_url}/queries/{job_id}/results", timeout=60)
+            response.raise_for_status()
+            return parse_serp(response.json()["results"][0]["content"])
+        except Exception as e:
+            return f"Error: {str(e)}"
+
+    def _collect(self, job_ids):
+        """Poll every job until done, fetching results of finished jobs as they complete."""
+        results = {}
+        pending = list(job_ids)
+        deadline = time.monotonic() + self.job_timeout
+        while pending and time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            statuses = list(self.pool.map(self._job_status, pending))
+            finished = [job for job, status in zip(pending, statuses) if status == "done"]
+            for job, status in zip(pending, statuses):
+                if status == "faulted":
+                    results[job] = "Error: Oxylabs job failed."
+            results.update(zip(finished, self.pool.map(self._job_results, finished)))
+            pending = [job for job in pending if job not in results]
+        for job in pending:
+            results[job] = "Error: Oxylabs job timed out."
+        return results
+
+    def _search_batch(self, queries, geo_location, locale):
+        serps = []
+        for start in range(0, len(queries), BATCH_SIZE):
+            chunk = queries[start:start + BATCH_SIZE]
+            try:
+                job_ids = self._submit_batch(chunk, geo_location, locale)
+            except Exception as e:
+                serps.extend([f"Error: {str(e)}"] * len(chunk))
+                continue
+            results = self._collect(job_ids)
+            serps.extend(results[job] for job in job_ids)
+        return serps
+
+    def search_many(self, queries, geo_location=OXYLABS_GEO, locale=OXYLABS_LOCALE):
+        """
+        Parsed SERPs for `queries`, in order. Each entry is a list of organic results or
+        an "Error: ..." string; errors are not cached.
+        """
+        serps = [None] * len(queries)
+        misses = {}
+        now = time.monotonic()
+        with _serp_lock:
+            for i, query in enumerate(queries):
+                key = cache_key(query, geo_location, locale)
+                cached = _serp_cache.get(key)
+                if cached and now - cached[0] < SERP_CACHE_TTL:
+                    serps[i] = cached[1]
+                else:
+                    misses.setdefault(key, []).append(i)
+        if not misses:
+            return serps
+
+        # One scrape per normalized query, sent as first spelled
+        unique = [queries[indices[0]] for indices in misses.values()]
+        if self.mode == "batch" and len(unique) > 1:
+            fetched = self._search_batch(unique, geo_location, locale)
+        else:
+            fetched = list(self.pool.map(lambda q: self._search_realtime(q, geo_location, locale), unique))
+
+        now = time.monotonic()
+        with _serp_lock:
+            for (key, indices), serp in zip(misses.items(), fetched):
+                if not isinstance(serp, str):
+                    store_serp(key, now, serp)
+                for i in indices:
+                    serps[i] = serp
+        return serps
+
+
+_oxylabs_client = None
+_client_lock = threading.Lock()
+
+
+def get_oxylabs_client():
+    """Shared client, or None when OXYLABS_USERNAME / OXYLABS_PASSWORD are not set."""
+    global _oxylabs_client
+    username = os.getenv("OXYLABS_USERNAME")
+    password = os.getenv("OXYLABS_PASSWORD")
+    if not username or not password:
+        return None
+    with _client_lock:
+        if _oxylabs_client is None:
+            _oxylabs_client = OxylabsClient(username, password)
+        return _oxylabs_client
+
 # -----------------------------------------------------------
-# 1. TOOL DEFINITION (FUNCTION-BASED)
+# 2. TOOL DEFINITION (FUNCTION-BASED)
 # -----------------------------------------------------------
 @tool("Oxylabs Search Tool")
 def oxylabs_search_tool(query: str) -> str:
@@ -19,41 +234,53 @@ def oxylabs_search_tool(query: str) -> str:
     A tool that performs a Google search using the Oxylabs Web Scraper API.
     The query should be a natural language string representing the search terms.
     """
-    username = os.getenv("OXYLABS_USERNAME")
-    password = os.getenv("OXYLABS_PASSWORD")
-    
-    if not username or not password:
+    client = get_oxylabs_client()
+    if client is None:
         return "Error: OXYLABS_USERNAME or OXYLABS_PASSWORD environment variables not set."
     
     try:
-        print(f"Initializing Oxylabs Search Tool with query: '{query}'")
-        
-        # The OxylabsSearchAPIWrapper uses the environment variables for authentication
-        oxylabs_wrapper = OxylabsSearchAPIWrapper(
-            oxylabs_username=username,
-            oxylabs_password=password
-        )
-        
-        return oxylabs_wrapper.run(query)
+        print(f"Running Oxylabs search with query: '{query}'")
+        return format_serp(query, client.search_many([query])[0])
         
     except Exception as e:
         return f"Failed to run Oxylabs Search Tool: {e}"
 
+@tool("Oxylabs Batch Search Tool")
+def oxylabs_batch_search_tool(queries: list, geo_location: str = "", locale: str = "") -> str:
+    """
+    Runs many Google searches at once through the Oxylabs Web Scraper API and returns
+    the top results for each query. Use this when monitoring several topics; pass the
+    queries as a list of strings, optionally with a geo_location (e.g. "United States")
+    and a locale (e.g. "en-us").
+    """
+    client = get_oxylabs_client()
+    if client is None:
+        return "Error: OXYLABS_USERNAME or OXYLABS_PASSWORD environment variables not set."
+
+    try:
+        queries = [str(q) for q in queries]
+        print(f"Running {len(queries)} Oxylabs searches")
+        serps = client.search_many(queries, geo_location or OXYLABS_GEO, locale or OXYLABS_LOCALE)
+        return "\n\n".join(format_serp(q, serp, limit=3) for q, serp in zip(queries, serps))
+
+    except Exception as e:
+        return f"Failed to run Oxylabs Batch Search Tool: {e}"
+
 # -----------------------------------------------------------
-# 2. LLM CONFIGURATION
+# 3. LLM CONFIGURATION
 # -----------------------------------------------------------
 llm_config = LLM(
     model="ollama/mistral"
 )
 
 # -----------------------------------------------------------
-# 3. AGENT DEFINITION
+# 4. AGENT DEFINITION
 # -----------------------------------------------------------
 search_analyst_agent = Agent(
     role='Oxylabs Search Analyst',
     goal=dedent("""\
         Perform accurate and reliable Google searches using the Oxylabs Web Scraper API.
-        Your single tool is the 'Oxylabs Search Tool'. You MUST use this tool to accomplish your task.
+        Use the 'Oxylabs Search Tool' for a single query, or the 'Oxylabs Batch Search Tool' to run many queries at once.
         Your only job is to formulate a correct 'query' string for the tool and execute it.
         Example of a correct Action Input: `{"query": "latest AI news"}`."""),
     backstory=dedent("""\
@@ -64,11 +291,11 @@ search_analyst_agent = Agent(
     verbose=True,
     llm=llm_config,
     allow_delegation=False,
-    tools=[oxylabs_search_tool]
+    tools=[oxylabs_search_tool, oxylabs_batch_search_tool]
 )
 
 # -----------------------------------------------------------
-# 4. TASK DEFINITION - UPDATED
+# 5. TASK DEFINITION - UPDATED
 # -----------------------------------------------------------
 search_task = Task(
     description=dedent("""\
@@ -85,7 +312,7 @@ search_task = Task(
 )
 
 # -----------------------------------------------------------
-# 5. CREW DEFINITION
+# 6. CREW DEFINITION
 # -----------------------------------------------------------
 oxylabs_crew = Crew(
     agents=[search_analyst_agent],
@@ -95,9 +322,131 @@ oxylabs_crew = Crew(
 )
 
 # -----------------------------------------------------------
-# 6. EXECUTION AND TESTING
+# 7. BENCHMARK (LOCAL STUB API)
+# -----------------------------------------------------------
+def start_stub_oxylabs_server(latency=0.5):
+    """
+    Local stand-in for the Oxylabs realtime and push-pull endpoints: realtime queries
+    answer after `latency` seconds, batch jobs report "done" `latency` seconds after
+    submission. Returns (server, base URL, request counter).
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    jobs = {}
+    counter = {"requests": 0, "connections": 0}
+    lock = threading.Lock()
+
+    def serp_for(query):
+        return {"results": [{"content": {"results": {"organic": [
+            {"title": f"{query} headline {i}", "url": f"https://news.example/{i}", "desc": f"About {query}"}
+            for i in range(5)
+        ]}}}]}
+
+    class StubOxylabsHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            with lock:
+                counter["connections"] += 1
+
+        def _reply(self, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            with lock:
+                counter["requests"] += 1
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path.endswith("/queries/batch"):
+                created = []
+                with lock:
+                    for query in request["query"]:
+                        job_id = str(len(jobs) + 1)
+                        jobs[job_id] = (time.monotonic() + latency, query)
+                        created.append({"id": job_id, "query": query, "status": "pending"})
+                self._reply({"queries": created})
+            else:
+                time.sleep(latency)
+                self._reply(serp_for(request["query"]))
+
+        def do_GET(self):
+            with lock:
+                counter["requests"] += 1
+            parts = self.path.strip("/").split("/")
+            ready_at, query = jobs[parts[2]]
+            if parts[-1] == "results":
+                self._reply(serp_for(query))
+            else:
+                self._reply({"id": parts[2], "status": "done" if time.monotonic() >= ready_at else "pending"})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOxylabsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1", counter
+
+
+def benchmark_scraping(n_queries=300, latency=0.5, naive_queries=10):
+    """Queries per minute of the old per-call path, realtime fan-out, batch jobs and a warm cache."""
+    server, base_url, counter = start_stub_oxylabs_server(latency)
+    queries = [f"AI news topic {i}" for i in range(n_queries)]
+
+    started = time.perf_counter()
+    for query in queries[:naive_queries]:
+        # The original tool: a new client and a synchronous request for every query
+        session = requests.Session()
+        session.auth = ("user", "pass")
+        session.post(f"{base_url}/queries", json={"source": "google_search", "query": query, "parse": True}).json()
+        session.close()
+    rate = naive_queries / (time.perf_counter() - started) * 60
+    print(f"per-call wrapper   : {rate:8.0f} queries/min")
+
+    for mode in ("realtime", "batch"):
+        _serp_cache.clear()
+        counter.update(requests=0, connections=0)
+        client = OxylabsClient("user", "pass", realtime_url=base_url, data_url=base_url, mode=mode, poll_interval=0.1)
+        started = time.perf_counter()
+        serps = client.search_many(queries)
+        elapsed = time.perf_counter() - started
+        ok = sum(not isinstance(serp, str) for serp in serps)
+        print(f"{mode:<19}: {n_queries / elapsed * 60:8.0f} queries/min  ({ok}/{n_queries} ok, "
+              f"{counter['requests']} HTTP requests over {counter['connections']} connections)")
+
+    counter.update(requests=0, connections=0)
+    started = time.perf_counter()
+    client.search_many(queries)
+    elapsed = time.perf_counter() - started
+    print(f"warm cache         : {elapsed * 1000:8.1f} ms for {n_queries} queries  ({counter['requests']} HTTP requests)")
+
+    # The single-query tool on a batch-mode client must not pay for a job and a poll
+    counter.update(requests=0, connections=0)
+    started = time.perf_counter()
+    client.search_many(["one uncached query"])
+    elapsed = time.perf_counter() - started
+    print(f"single query       : {elapsed * 1000:8.1f} ms in batch mode  ({counter['requests']} HTTP requests)")
+
+    # Spellings that share a cache key share one scrape
+    counter.update(requests=0, connections=0)
+    variants = ["AI agents", "ai  agents", " Ai Agents"]
+    serps = client.search_many(variants)
+    assert serps[0] is serps[1] is serps[2], "spelling variants were scraped separately"
+    print(f"spelling variants  : {len(variants)} queries  ({counter['requests']} HTTP requests)")
+    server.shutdown()
+
+
+# -----------------------------------------------------------
+# 8. EXECUTION AND TESTING
 # -----------------------------------------------------------
 if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark_scraping()
+        sys.exit(0)
+
     print("## Starting the Oxylabs Crew")
     result = oxylabs_crew.kickoff()
     print("\n\n################################################")
@@ -1,4 +1,11 @@
 import os
+import re
+import sys
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from crewai import Agent, Task, Crew, Process, LLM # Import LLM from crewai
 from crewai.tools import tool
 from langchain_community.tools.passio_nutrition_ai import NutritionAI
@@ -36,6 +43,418 @@ else:
     print("NutritionAI tool cannot be initialized without a subscription key.")
 
 
+# --- Local Food Index ---
+# Every NutritionAI response is folded into a local catalog of canonical foods with
+# per-100g nutrients. Free-text queries ("bananna", "1 large banana", "banana, fresh") are
+# matched against it with a prefix trie and a trigram/Levenshtein fuzzy matcher, and
+# confident matches are answered locally without a paid upstream call. A fuzzy match
+# must also agree word by word up to typos, so "green pea" never resolves to "green tea".
+FOOD_CACHE_PATH = os.getenv("NUTRITION_FOOD_CACHE", ".nutrition_cache/foods.json")
+MATCH_CONFIDENCE = 0.85
+QUANTITY_WORDS = {
+    "a", "an", "of", "g", "gram", "grams", "kg", "oz", "ounce", "ounces", "lb", "lbs", "pound", "pounds",
+    "ml", "l", "cup", "cups", "tbsp", "tablespoon", "tablespoons", "tsp", "teaspoon", "teaspoons",
+    "slice", "slices", "piece", "pieces", "serving", "servings", "small", "medium", "large", "extra",
+    "fresh", "organic",
+}
+
+
+def normalize_food_name(text):
+    """Lowercase food name with numbers, units, sizes and neutral descriptors removed."""
+    words = re.findall(r"[a-z]+", text.lower())
+    words = [w for w in words if w not in QUANTITY_WORDS]
+    words = [w[:-3] + "y" if w.endswith("ies") and len(w) > 4 else w[:-1] if w.endswith("s") and not w.endswith("ss") and len(w) > 3 else w
+             for w in words]
+    return " ".join(words)
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def levenshtein(a, b, limit=None):
+    """Edit distance between a and b; stops early and returns limit + 1 once it is exceeded."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def typo_budget(word):
+    """Edits a word of this length may differ by and still be a typo rather than another word."""
+    return 0 if len(word) <= 3 else 1 if len(word) <= 7 else 2
+
+
+def same_words_up_to_typos(term, candidate):
+    """True if both names have the same words in order, each within its typo budget."""
+    words, candidate_words = term.split(), candidate.split()
+    if len(words) != len(candidate_words):
+        return False
+    for word, other in zip(words, candidate_words):
+        budget = typo_budget(min(word, other, key=len))
+        if levenshtein(word, other, budget) > budget:
+            return False
+    return True
+
+
+def parse_nutritionai_response(response):
+    """
+    Canonical food records from a NutritionAI response: name, per-100g nutrient amounts
+    and units, and named portions in grams. Uses the ingredient nutrient list when present
+    (amounts per 100 g) and otherwise rescales the nutrition preview from its portion weight.
+    """
+    if isinstance(response, str):
+        try:
+            response = json.loads(response)
+        except json.JSONDecodeError:
+            return []
+    results = response.get("results", []) if isinstance(response, dict) else response or []
+    records = []
+    for item in results:
+        if not isinstance(item, dict):
+            continue
+        name = item.get("displayName") or item.get("longName") or item.get("shortName") or item.get("name")
+        if not name:
+            continue
+        per_100g, units, portions = {}, {}, {}
+        for ingredient in item.get("ingredients", [])[:1]:
+            for entry in ingredient.get("nutrients", []):
+                nutrient = entry.get("nutrient", {})
+                key = (nutrient.get("shortName") or nutrient.get("name") or "").lower()
+                if key and entry.get("amount") is not None:
+                    per_100g[key] = float(entry["amount"])
+                    units[key] = nutrient.get("unit", "").lower()
+            for portion in ingredient.get("portions", []):
+                weight = portion.get("weight", {})
+                if portion.get("name") and weight.get("unit", "g").lower() == "g" and weight.get("value"):
+                    portions[portion["name"].lower()] = float(weight["value"]) / float(portion.get("quantity") or 1)
+        preview = item.get("nutritionPreview") or {}
+        weight = (preview.get("portion") or {}).get("weight") or {}
+        if not per_100g and preview and weight.get("value"):
+            scale = 100.0 / float(weight["value"])
+            for key, unit in (("calories", "kcal"), ("protein", "g"), ("carbs", "g"), ("fat", "g")):
+                if preview.get(key) is not None:
+                    per_100g[key] = float(preview[key]) * scale
+                    units[key] = unit
+        portion = preview.get("portion") or {}
+        if portion.get("name") and weight.get("value"):
+            portions.setdefault(portion["name"].lower(), float(weight["value"]) / float(portion.get("quantity") or 1))
+        if per_100g:
+            records.append({"name": name, "per_100g": per_100g, "units": units, "portions": portions})
+    return records
+
+
+class FoodIndex:
+    """
+    Canonical food records keyed by normalized name, plus aliases (normalized queries that
+    resolved to them). Lookups try an exact key, then trie prefix completions and trigram
+    candidates scored by Levenshtein similarity.
+    """
+
+    def __init__(self, path=FOOD_CACHE_PATH):
+        self.path = path
+        self.foods = {}
+        self.aliases = {}
+        self.trie = {}
+        self.grams = {}
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            for record in data.get("foods", {}).values():
+                self.add_record(record)
+            for alias, key in data.get("aliases", {}).items():
+                self.add_alias(alias, key)
+
+    def _index_term(self, term, key):
+        node = self.trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node.setdefault("$", set()).add(key)
+        for gram in trigrams(term):
+            self.grams.setdefault(gram, set()).add(term)
+
+    def add_record(self, record):
+        key = normalize_food_name(record["name"])
+        if not key:
+            return None
+        self.foods[key] = record
+        self._index_term(key, key)
+        return key
+
+    def add_alias(self, alias, key):
+        alias = normalize_food_name(alias)
+        if alias and key in self.foods:
+            self.aliases[alias] = key
+            self._index_term(alias, key)
+
+    def _keys_for(self, term):
+        node = self.trie
+        for ch in term:
+            node = node.get(ch)
+            if node is None:
+                return set()
+        return node.get("$", set())
+
+    def complete(self, prefix, limit=20):
+        """Canonical keys of every indexed name or alias starting with `prefix`."""
+        node = self.trie
+        for ch in prefix:
+            node = node.get(ch)
+            if node is None:
+                return []
+        found, stack = [], [node]
+        while stack and len(found) < limit:
+            node = stack.pop()
+            found.extend(node.get("$", ()))
+            stack.extend(child for ch, child in node.items() if ch != "$")
+        return list(dict.fromkeys(found))[:limit]
+
+    def match(self, query):
+        """
+        Returns:
+            (record, confidence) for the closest canonical food, or (None, 0.0)
+        """
+        term = normalize_food_name(query)
+        if not term:
+            return None, 0.0
+        keys = self._keys_for(term)
+        if keys:
+            return self.foods[next(iter(keys))], 1.0
+
+        query_grams = trigrams(term)
+        overlap = {}
+        for gram in query_grams:
+            for candidate in self.grams.get(gram, ()):
+                overlap[candidate] = overlap.get(candidate, 0) + 1
+        candidates = sorted(overlap, key=lambda c: -overlap[c] / len(query_grams | trigrams(c)))[:25]
+        candidates += [k for k in self.complete(term, 5) if k not in candidates]
+
+        best, best_score = None, 0.0
+        for candidate in candidates:
+            longest = max(len(term), len(candidate))
+            # Beyond this many edits the match could never reach MATCH_CONFIDENCE
+            limit = int(longest * (1 - MATCH_CONFIDENCE))
+            distance = levenshtein(term, candidate, limit)
+            score = 1.0 - distance / longest
+            if score > best_score and same_words_up_to_typos(term, candidate):
+                best, best_score = candidate, score
+        if best is None:
+            return None, 0.0
+        key = best if best in self.foods else self.aliases.get(best, next(iter(self._keys_for(best)), None))
+        return self.foods.get(key), best_score
+
+    def learn(self, query, response):
+        """Fold an upstream response into the index; the query becomes an alias of the top result."""
+        with self.lock:
+            keys = [self.add_record(record) for record in parse_nutritionai_response(response)]
+            keys = [k for k in keys if k]
+            if keys:
+                self.add_alias(query, keys[0])
+                self.save()
+            return keys
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"foods": self.foods, "aliases": self.aliases}, f)
+        os.replace(tmp_path, self.path)
+
+
+def format_food_record(record, query=None, confidence=None):
+    """Per-100g nutrient summary for a cached food record."""
+    lines = [f"{record['name']} (per 100 g, from the local food index"
+             + (f"; matched '{query}' with confidence {confidence:.2f}" if query else "") + "):"]
+    for key, amount in record["per_100g"].items():
+        lines.append(f"- {key}: {amount:g} {record['units'].get(key, '')}".rstrip())
+    if record.get("portions"):
+        lines.append("Common portions: " + ", ".join(f"{name} ({grams:g} g)" for name, grams in record["portions"].items()))
+    return "\n".join(lines)
+
+
+food_index = FoodIndex()
+
+
+# --- Portions and Meal Aggregation ---
+# Quantities are converted to grams locally so a food is fetched once (by name, per 100 g)
+# and every portion of it is scaled from the cached record.
+MASS_UNITS = {"g": 1.0, "gram": 1.0, "grams": 1.0, "mg": 0.001, "kg": 1000.0,
+              "oz": 28.3495, "ounce": 28.3495, "ounces": 28.3495,
+              "lb": 453.592, "lbs": 453.592, "pound": 453.592, "pounds": 453.592}
+VOLUME_UNITS = {"ml": 1.0, "l": 1000.0, "liter": 1000.0, "litre": 1000.0, "cup": 236.6, "cups": 236.6,
+                "tbsp": 14.79, "tablespoon": 14.79, "tablespoons": 14.79,
+                "tsp": 4.93, "teaspoon": 4.93, "teaspoons": 4.93, "floz": 29.57}
+# Grams per millilitre for foods commonly measured by volume; anything else assumes water
+DENSITY_G_PER_ML = {
+    "water": 1.0, "milk": 1.03, "yogurt": 1.03, "cream": 1.0, "juice": 1.04, "oil": 0.92, "olive oil": 0.91,
+    "butter": 0.96, "honey": 1.42, "maple syrup": 1.32, "sugar": 0.85, "brown sugar": 0.93, "flour": 0.53,
+    "oat": 0.34, "rice": 0.79, "cooked rice": 0.79, "quinoa": 0.73, "pasta": 0.6, "cereal": 0.15,
+    "peanut butter": 1.08, "salt": 1.2, "cocoa powder": 0.42, "spinach": 0.13, "berry": 0.6, "bean": 0.75,
+}
+SIZE_FACTORS = {"small": 0.75, "medium": 1.0, "large": 1.3, "extra large": 1.6}
+DEFAULT_PORTION_GRAMS = 100.0
+FRACTIONS = {"\u00bd": 0.5, "\u2153": 1 / 3, "\u2154": 2 / 3, "\u00bc": 0.25, "\u00be": 0.75}
+PORTION_PATTERN = re.compile(
+    r"^\s*(?P<qty>\d+\s+\d+/\d+|\d+/\d+|\d*\.?\d+)?\s*"
+    r"(?P<unit>fl\.?\s*oz|[a-z]+\b)?\s*(?:of\s+)?(?P<rest>.*)$"
+)
+
+
+def _parse_quantity(text):
+    if not text:
+        return None
+    total = 0.0
+    for part in text.split():
+        if "/" in part:
+            numerator, denominator = part.split("/")
+            total += float(numerator) / float(denominator)
+        else:
+            total += float(part)
+    return total
+
+
+def parse_portion(text):
+    """
+    Split an ingredient line into quantity, unit, size and food name.
+
+    "100g chicken breast" -> (100, "g", None, "chicken breast")
+    "1 1/2 cups cooked rice" -> (1.5, "cup", None, "cooked rice")
+    "1 large banana" -> (1, None, "large", "banana")
+    """
+    text = text.strip().lower()
+    for symbol, value in FRACTIONS.items():
+        text = text.replace(symbol, f" {value} ")
+    match = PORTION_PATTERN.match(text)
+    quantity, unit, rest = _parse_quantity(match.group("qty")), match.group("unit"), match.group("rest")
+    if unit:
+        unit = re.sub(r"[\s.]", "", unit)
+        if unit not in MASS_UNITS and unit not in VOLUME_UNITS:
+            rest, unit = f"{match.group('unit')} {rest}".strip(), None
+    size = None
+    for name in sorted(SIZE_FACTORS, key=len, reverse=True):
+        if rest.startswith(name + " "):
+            size, rest = name, rest[len(name):].strip()
+            break
+    return {"quantity": quantity if quantity is not None else 1.0, "unit": unit, "size": size,
+            "food": rest.strip(" ,") or text}
+
+
+def density_for(food):
+    """Grams per ml for `food` and whether the value came from the table."""
+    term = normalize_food_name(food)
+    for name in sorted(DENSITY_G_PER_ML, key=len, reverse=True):
+        if name in term:
+            return DENSITY_G_PER_ML[name], True
+    return 1.0, False
+
+
+def portion_grams(portion, record):
+    """
+    Grams for a parsed portion: mass units convert directly, volumes use the record's own
+    portion of that name ("cup") or the density table, and counts use the record's named
+    portions (scaled by size) or 100 g.
+
+    Returns:
+        (grams, note) where note explains any assumption that was made
+    """
+    quantity, unit = portion["quantity"], portion["unit"]
+    portions = (record or {}).get("portions", {})
+    if unit in MASS_UNITS:
+        return quantity * MASS_UNITS[unit], None
+    if unit in VOLUME_UNITS:
+        for name in (unit, unit.rstrip("s")):
+            if name in portions:
+                return quantity * portions[name], None
+        density, known = density_for(portion["food"])
+        return quantity * VOLUME_UNITS[unit] * density, None if known else "volume converted assuming water density"
+    size = portion["size"]
+    if size and size in portions:
+        return quantity * portions[size], None
+    base = portions.get("medium") or next(iter(portions.values()), None)
+    if base:
+        return quantity * base * SIZE_FACTORS.get(size or "medium", 1.0), None
+    return quantity * DEFAULT_PORTION_GRAMS * SIZE_FACTORS.get(size or "medium", 1.0), "no portion size known, assumed 100 g each"
+
+
+def scale_nutrients(record, grams):
+    return {key: amount * grams / 100.0 for key, amount in record["per_100g"].items()}
+
+
+def resolve_food(food):
+    """
+    Canonical record for a food name: the local index when confident, otherwise one
+    NutritionAI call for the bare name (never the portion), folded into the index.
+
+    Returns:
+        (record or None, raw upstream result or None)
+    """
+    record, confidence = food_index.match(food)
+    if record and confidence >= MATCH_CONFIDENCE:
+        return record, None
+    if not nutritionai_langchain_tool:
+        return None, None
+    result = nutritionai_langchain_tool.invoke(food)
+    keys = food_index.learn(food, result)
+    return (food_index.foods[keys[0]] if keys else None), result
+
+
+def analyze_ingredients(lines, max_workers=8):
+    """
+    Resolve and total a list of ingredient lines.
+
+    Each distinct unknown food costs at most one upstream call (run concurrently); foods
+    are deduplicated by normalized name but looked up by the first spelling given, so
+    NutritionAI sees "tomatoes" rather than the normalized key. The totals are one matrix
+    product of portion weights against per-100g nutrient vectors.
+
+    Returns:
+        (items, totals, units) where items are (line, record, grams, note) and totals maps
+        nutrient -> summed amount
+    """
+    portions = [parse_portion(line) for line in lines if line.strip()]
+    foods = {}
+    for portion in portions:
+        foods.setdefault(normalize_food_name(portion["food"]) or portion["food"], portion["food"])
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        resolved = dict(zip(foods, pool.map(lambda food: resolve_food(food)[0], foods.values())))
+
+    items = []
+    for line, portion in zip([l for l in lines if l.strip()], portions):
+        record = resolved[normalize_food_name(portion["food"]) or portion["food"]]
+        grams, note = portion_grams(portion, record) if record else (0.0, "not found")
+        items.append((line.strip(), record, grams, note))
+
+    known = [item for item in items if item[1]]
+    nutrients = list(dict.fromkeys(key for _, record, _, _ in known for key in record["per_100g"]))
+    units = {}
+    for _, record, _, _ in known:
+        for key in record["per_100g"]:
+            units.setdefault(key, record["units"].get(key, ""))
+    if not known:
+        return items, {}, units
+    column = {key: i for i, key in enumerate(nutrients)}
+    per_100g = np.zeros((len(known), len(nutrients)))
+    for row, (_, record, _, _) in enumerate(known):
+        for key, amount in record["per_100g"].items():
+            per_100g[row, column[key]] = amount
+    grams = np.array([g for _, _, g, _ in known])
+    totals = (grams / 100.0) @ per_100g
+    return items, dict(zip(nutrients, totals.tolist())), units
+
+
+
+
 @tool("NutritionAI Search Tool")
 def nutritionai_search_tool(query: str) -> str:
     """
@@ -49,15 +468,61 @@ def nutritionai_search_tool(query: str) -> str:
         str: A summary of the nutritional information from Passio NutritionAI.
              Returns an error message if the API key is missing or an error occurs during the search.
     """
-    if not nutritionai_langchain_tool:
+    # Answer from the local index when the food is already known with high confidence;
+    # otherwise fetch the bare food name once and scale the requested portion locally
+    portion = parse_portion(query)
+    record, confidence = food_index.match(query)
+    if not (record and confidence >= MATCH_CONFIDENCE) and not nutritionai_langchain_tool:
         return "NutritionAI tool is not initialized. Please provide a valid NUTRITIONAI_SUBSCRIPTION_KEY."
     try:
-        # Invoke the original NutritionAI tool with the query
-        result = nutritionai_langchain_tool.invoke(query)
-        return result
+        result = None
+        if not (record and confidence >= MATCH_CONFIDENCE):
+            record, result = resolve_food(portion["food"])
+            confidence = 1.0
+        if not record:
+            return result
+        grams, note = portion_grams(portion, record)
+        scaled = scale_nutrients(record, grams)
+        lines = [f"For {query.strip()} (~{grams:.0f} g{'; ' + note if note else ''}):"]
+        lines += [f"- {key}: {amount:.1f} {record['units'].get(key, '')}".rstrip() for key, amount in scaled.items()]
+        return "\n".join(lines) + "\n\n" + format_food_record(record, query, confidence)
     except Exception as e:
         return f"An error occurred while searching NutritionAI: {e}"
 
+
+@tool("Meal Nutrition Analysis Tool")
+def meal_analysis_tool(ingredients: list) -> str:
+    """
+    Totals the nutrition of a whole meal or recipe in one call.
+
+    Args:
+        ingredients (list): Ingredient lines with portions, e.g. ["200g chicken breast", "1 cup cooked rice", "1 large banana"].
+                            A single string with one ingredient per line (or separated by ';') also works.
+
+    Returns:
+        str: Per-ingredient weights and calories, followed by the meal totals for every nutrient.
+    """
+    if isinstance(ingredients, str):
+        ingredients = re.split(r"[\n;]+", ingredients)
+    try:
+        items, totals, units = analyze_ingredients([str(line) for line in ingredients])
+    except Exception as e:
+        return f"An error occurred while analyzing the meal: {e}"
+    if not items:
+        return "No ingredients provided."
+
+    lines = ["Ingredients:"]
+    for line, record, grams, note in items:
+        if record:
+            calories = record["per_100g"].get("calories")
+            detail = f"{record['name']}, ~{grams:.0f} g" + (f", {calories * grams / 100:.0f} kcal" if calories is not None else "")
+        else:
+            detail = "not found"
+        lines.append(f"- {line}: {detail}" + (f" ({note})" if note and record else ""))
+    lines.append("\nMeal totals:")
+    lines += [f"- {key}: {amount:.1f} {units.get(key, '')}".rstrip() for key, amount in totals.items()]
+    return "\n".join(lines)
+
 # --- Gemini LLM Setup ---
 # Retrieve the Google API key from environment variables
 try:
@@ -94,7 +559,7 @@ if gemini_llm:
                      always strive to deliver comprehensive and easy-to-understand nutrition facts.""",
         verbose=True,
         allow_delegation=False,
-        tools=[nutritionai_search_tool],
+        tools=[nutritionai_search_tool, meal_analysis_tool],
         llm=gemini_llm # Assign the initialized LLM object
     )
 else:
@@ -112,6 +577,8 @@ if nutrition_expert_agent:
                        - Macronutrients (Protein, Carbs, Fats)
                        - Key Micronutrients (e.g., Vitamin C, Iron, Calcium - if available)
                        - Any other relevant nutritional facts.
+                       If it is a meal or recipe with several ingredients, analyze them all in one
+                       call to the Meal Nutrition Analysis Tool instead of one search per ingredient.
                        Present the information clearly and concisely.""",
         expected_output="""A well-structured summary of the nutritional information for the specified food item,
                            including calories, macronutrients, and key micronutrients.
@@ -125,7 +592,7 @@ if nutrition_expert_agent:
                            - Potassium: 235mg (5% DV)
                            - Other: Rich in antioxidants.'""",
         agent=nutrition_expert_agent,
-        tools=[nutritionai_search_tool]
+        tools=[nutritionai_search_tool, meal_analysis_tool]
     )
 
 # --- Crew Definition and Execution ---
@@ -139,9 +606,137 @@ if nutrition_expert_agent and nutrition_analysis_task:
         verbose=True
     )
 
+# --- Benchmark ---
+def benchmark_food_index(n_foods=3000, n_queries=2000, seed=0):
+    """Local hit rate and lookup latency for misspelled and portion-prefixed queries."""
+    import random
+    rng = random.Random(seed)
+    letters = "abcdefghiklmnoprstuvy"
+    index = FoodIndex(path=None)
+    names = []
+    while len(names) < n_foods:
+        name = " ".join("".join(rng.choice(letters) for _ in range(rng.randint(5, 9))) for _ in range(rng.randint(1, 3)))
+        if index.add_record({"name": name, "per_100g": {"calories": rng.uniform(20, 600)}, "units": {"calories": "kcal"},
+                             "portions": {}}):
+            names.append(name)
+
+    def misspell(name):
+        chars = list(name)
+        i = rng.randrange(len(chars))
+        if chars[i] != " ":
+            chars[i] = rng.choice(letters)
+        return "".join(chars)
+
+    variants = [
+        ("exact", lambda n: n),
+        ("portion", lambda n: f"{rng.randint(1, 3)} large {n}"),
+        ("descriptor", lambda n: f"{n}, fresh"),
+        ("one typo", misspell),
+    ]
+    for label, variant in variants:
+        hits = correct = 0
+        started = time.perf_counter()
+        for _ in range(n_queries):
+            name = rng.choice(names)
+            record, confidence = index.match(variant(name))
+            if confidence >= MATCH_CONFIDENCE:
+                hits += 1
+                correct += record["name"] == name
+        elapsed = (time.perf_counter() - started) / n_queries * 1e6
+        print(f"{label:10s}: answered locally {hits / n_queries:6.1%}  correct {correct / max(hits, 1):6.1%}  {elapsed:7.1f} us/query")
+
+
+def run_regression_checks():
+    """
+    Known-answer checks for the fuzzy matcher (typos resolve, look-alike foods do not) and
+    for the names analyze_ingredients sends upstream.
+    """
+    global nutritionai_langchain_tool, food_index
+    index = FoodIndex(path=None)
+    for name in ("green tea", "goat milk", "skim milk", "banana", "chicken breast", "cheddar cheese"):
+        index.add_record({"name": name, "per_100g": {"calories": 100.0}, "units": {"calories": "kcal"}, "portions": {}})
+    checks = [
+        ("bananna", "banana"),
+        ("1 large banana", "banana"),
+        ("chiken breast", "chicken breast"),
+        ("chedar cheese", "cheddar cheese"),
+        # Different foods one edit apart must not be answered from the local index
+        ("green pea", None),
+        ("1 cup green peas", None),
+        ("oat milk", None),
+        # Descriptors that change the nutrition are part of the food name
+        ("whole milk", None),
+        ("1 cup whole milk", None),
+    ]
+    failures = 0
+    for query, want in checks:
+        record, confidence = index.match(query)
+        got = record["name"] if record and confidence >= MATCH_CONFIDENCE else None
+        ok = got == want
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {query!r}: got {got!r} ({confidence:.3f}), expected {want!r}")
+
+    calls = []
+
+    class StubNutritionAI:
+        def invoke(self, query):
+            calls.append(query)
+            return {"results": [{"displayName": query.title(), "ingredients": [{
+                "nutrients": [{"nutrient": {"shortName": "calories", "unit": "KCAL"}, "amount": 50.0}]}]}]}
+
+    saved = nutritionai_langchain_tool, food_index
+    nutritionai_langchain_tool, food_index = StubNutritionAI(), FoodIndex(path=None)
+    try:
+        analyze_ingredients(["2 tomatoes", "1 cup hummus", "200g tomatoes", "1 cup whole milk", "50g raw oats"], max_workers=1)
+    finally:
+        nutritionai_langchain_tool, food_index = saved
+    want = ["tomatoes", "hummus", "whole milk", "raw oats"]
+    ok = calls == want
+    failures += not ok
+    print(f"{'ok  ' if ok else 'FAIL'} upstream lookups: got {calls!r}, expected {want!r}")
+    return failures
+
+
+def benchmark_meal_analysis(n_items=20, latency=0.2):
+    """Upstream calls and wall time for a recipe, cold and warm, against a stub NutritionAI."""
+    global nutritionai_langchain_tool, food_index
+    foods = ["chicken breast", "cooked rice", "banana", "olive oil", "broccoli", "salmon", "egg", "milk",
+             "oat", "almond", "spinach", "tomato", "onion", "garlic", "cheddar cheese", "bread"]
+    calls = []
+
+    class StubNutritionAI:
+        def invoke(self, query):
+            calls.append(query)
+            time.sleep(latency)
+            amounts = [("calories", "KCAL", 50 + len(query) * 10), ("protein", "G", len(query) / 2), ("fat", "G", 3.0)]
+            return {"results": [{"displayName": query.title(), "ingredients": [{
+                "nutrients": [{"nutrient": {"shortName": k, "unit": u}, "amount": a} for k, u, a in amounts],
+                "portions": [{"name": "medium", "quantity": 1, "weight": {"unit": "g", "value": 120}}]}]}]}
+
+    saved = nutritionai_langchain_tool, food_index
+    nutritionai_langchain_tool, food_index = StubNutritionAI(), FoodIndex(path=None)
+    recipe = [f"{(i % 3 + 1) * 50}g {foods[i % len(foods)]}" if i % 2 else f"{i % 2 + 1} cup {foods[i % len(foods)]}"
+              for i in range(n_items)]
+    try:
+        print(f"{n_items}-item recipe, {len(set(foods[i % len(foods)] for i in range(n_items)))} distinct foods, "
+              f"stub latency {latency * 1000:.0f} ms")
+        for label in ("cold", "warm"):
+            calls.clear()
+            started = time.perf_counter()
+            analyze_ingredients(recipe)
+            print(f"{label}: {len(calls):3d} upstream calls  {(time.perf_counter() - started) * 1000:8.1f} ms")
+    finally:
+        nutritionai_langchain_tool, food_index = saved
+
+
 # Main execution block
 if __name__ == '__main__':
-    if not nutrition_crew:
+    if "--check" in sys.argv:
+        sys.exit(1 if run_regression_checks() else 0)
+    elif "--benchmark" in sys.argv:
+        benchmark_food_index()
+        benchmark_meal_analysis()
+    elif not nutrition_crew:
         print("\nSkipping CrewAI execution because the crew could not be created.")
         print("Please check your API keys and ensure all components are initialized correctly.")
     else:
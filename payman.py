@@ -1,4 +1,18 @@
 import os
+import sys
+import mmap
+import time
+import zlib
+import uuid
+import struct
+import random
+import shutil
+import atexit
+import asyncio
+import hashlib
+import tempfile
+import threading
+from collections import defaultdict
 from crewai import Agent, Task, Crew, Process, LLM
 # Corrected import for BaseTool
 from crewai.tools import BaseTool
@@ -14,6 +28,314 @@ llm = LLM(
     temperature=0.7,
 )
 
+# --- Payment Engine Configuration ---
+LEDGER_PATH = os.getenv("PAYMAN_LEDGER_PATH", ".payman/ledger.bin")
+PAYMENT_WORKERS = int(os.getenv("PAYMAN_WORKERS", "256"))
+MAX_RETRIES = 3
+# How long a finished payment may wait for the next ledger flush before it is reported
+COMMIT_INTERVAL = 0.005
+
+
+# --- Append-Only Ledger ---
+# Fixed-size records: magic, status, amount in cents, payee id, idempotency key
+# (sha256 digest), transaction id, padding and a CRC32 over everything before it.
+RECORD = struct.Struct("<4sBq48s32s24s7xI")
+RECORD_MAGIC = b"PAY1"
+ACCEPTED, SENT, FAILED = 1, 2, 3
+STATUS_NAMES = {ACCEPTED: "accepted", SENT: "sent", FAILED: "failed"}
+
+
+def idempotency_key(*parts):
+    """32-byte key identifying one logical payment; the same parts always give the same key."""
+    return hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8")).digest()
+
+
+def to_cents(amount):
+    cents = int(round(float(amount) * 100))
+    if cents <= 0:
+        raise ValueError(f"Payment amount must be positive, got {amount}")
+    return cents
+
+
+class Ledger:
+    """
+    Append-only payment ledger in a memory-mapped file.
+
+    Every state change (accepted, sent, failed) is a new fixed-size record, so a write
+    never touches existing records. On open the file is scanned up to the first empty
+    or torn record (bad CRC after a crash mid-write), which becomes the append position;
+    the latest record per idempotency key is the payment's state, and payments still
+    "accepted" are returned by `pending()` so the engine can resume them.
+    """
+
+    def __init__(self, path=LEDGER_PATH, initial_records=8192):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "a+b")
+        size = os.fstat(self.file.fileno()).st_size
+        if size < RECORD.size * initial_records:
+            self.file.truncate(RECORD.size * initial_records)
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+        self.state = {}
+        self.offset = 0
+        self.synced = 0
+        self.torn_records = 0
+        self._recover()
+
+    def _recover(self):
+        while self.offset + RECORD.size <= len(self.mm):
+            raw = self.mm[self.offset:self.offset + RECORD.size]
+            if raw[:4] != RECORD_MAGIC:
+                break
+            fields = RECORD.unpack(raw)
+            if zlib.crc32(raw[:-4]) != fields[-1]:
+                # Torn write from a crash: drop it and append from here
+                self.mm[self.offset:self.offset + RECORD.size] = bytes(RECORD.size)
+                self.torn_records += 1
+                break
+            _, status, cents, payee, key, txn, _ = fields
+            self.state[key] = (status, cents, payee.rstrip(b"\0").decode("utf-8"), txn.rstrip(b"\0").decode("ascii"))
+            self.offset += RECORD.size
+        self.synced = self.offset
+
+    def _grow(self):
+        size = len(self.mm) * 2
+        self.mm.flush()
+        self.mm.close()
+        self.file.truncate(size)
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+
+    def append(self, status, cents, payee_id, key, txn=""):
+        payee = payee_id.encode("utf-8")
+        if len(payee) > 48:
+            raise ValueError(f"Payee id longer than 48 bytes: {payee_id!r}")
+        if self.offset + RECORD.size > len(self.mm):
+            self._grow()
+        packed = RECORD.pack(RECORD_MAGIC, status, cents, payee, key, txn.encode("ascii"), 0)
+        packed = packed[:-4] + struct.pack("<I", zlib.crc32(packed[:-4]))
+        self.mm[self.offset:self.offset + RECORD.size] = packed
+        self.offset += RECORD.size
+        self.state[key] = (status, cents, payee_id, txn)
+
+    def sync(self):
+        """Flush records appended since the last sync to disk."""
+        if self.synced == self.offset:
+            return
+        start = self.synced - self.synced % mmap.ALLOCATIONGRANULARITY
+        self.mm.flush(start, self.offset - start)
+        self.synced = self.offset
+
+    def pending(self):
+        return [(key, cents, payee) for key, (status, cents, payee, _) in self.state.items() if status == ACCEPTED]
+
+    def close(self):
+        self.sync()
+        self.mm.close()
+        self.file.close()
+
+
+# --- Payment Backend ---
+class TransientPaymentError(Exception):
+    pass
+
+
+class MockPaymanBackend:
+    """
+    Stand-in for the PaymanAI API: one call per payment with a fixed latency, occasional
+    transient failures, and idempotency keys honoured the way payment APIs do, so a
+    retried key returns the original transaction instead of paying twice.
+    """
+
+    def __init__(self, latency=0.02, failure_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.transactions = {}
+        self.calls = 0
+        self.order = defaultdict(list)
+
+    async def send(self, key, cents, payee_id):
+        self.calls += 1
+        if key in self.transactions:
+            return self.transactions[key]
+        await asyncio.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise TransientPaymentError("upstream timeout")
+        self.transactions[key] = uuid.uuid4().hex[:16]
+        self.order[payee_id].append(key)
+        return self.transactions[key]
+
+
+# --- Payment Engine ---
+class PaymentEngine:
+    """
+    Idempotent, ordered payment execution on a background event loop.
+
+    Payments are sharded by payee onto `workers` queues, each drained by one worker, so
+    payments to the same payee are sent in submission order while different payees run
+    concurrently. A payment is recorded as accepted before it is sent; its outcome is
+    appended once the backend answers and reported to the caller after the next group
+    flush of the ledger. Resubmitting a key that is already sent returns the original
+    transaction, and a key still in flight shares the pending result.
+    """
+
+    def __init__(self, backend=None, ledger=None, workers=PAYMENT_WORKERS, max_retries=MAX_RETRIES,
+                 commit_interval=COMMIT_INTERVAL):
+        self.backend = backend or MockPaymanBackend()
+        self.ledger = ledger or Ledger()
+        self.workers = workers
+        self.max_retries = max_retries
+        self.commit_interval = commit_interval
+        self.inflight = {}
+        self.recovered = 0
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+
+    async def _start(self):
+        self.queues = [asyncio.Queue() for _ in range(self.workers)]
+        self.commit_waiters = []
+        self.dirty = asyncio.Event()
+        self.tasks = [asyncio.create_task(self._worker(queue)) for queue in self.queues]
+        self.tasks.append(asyncio.create_task(self._committer()))
+        for key, cents, payee in self.ledger.pending():
+            self._enqueue(key, cents, payee)
+            self.recovered += 1
+
+    def _enqueue(self, key, cents, payee_id):
+        future = self.loop.create_future()
+        self.inflight[key] = future
+        self.queues[zlib.crc32(payee_id.encode("utf-8")) % self.workers].put_nowait((key, cents, payee_id, future))
+        return future
+
+    def _submit(self, cents, payee_id, key):
+        if key in self.inflight:
+            return self.inflight[key]
+        record = self.ledger.state.get(key)
+        if record and record[0] == SENT:
+            future = self.loop.create_future()
+            future.set_result(self._result(key, SENT, cents, payee_id, record[3], duplicate=True))
+            return future
+        self.ledger.append(ACCEPTED, cents, payee_id, key)
+        return self._enqueue(key, cents, payee_id)
+
+    @staticmethod
+    def _result(key, status, cents, payee_id, txn, duplicate=False, error=None):
+        return {
+            "idempotency_key": key.hex()[:16],
+            "payee_id": payee_id,
+            "amount": cents / 100,
+            "status": "duplicate" if duplicate else STATUS_NAMES[status],
+            "transaction_id": txn,
+            "error": error,
+        }
+
+    async def _worker(self, queue):
+        while True:
+            key, cents, payee_id, future = await queue.get()
+            txn, error = "", None
+            for attempt in range(self.max_retries + 1):
+                try:
+                    txn = await self.backend.send(key, cents, payee_id)
+                    break
+                except TransientPaymentError as e:
+                    error = str(e)
+                    await asyncio.sleep(0.01 * 2 ** attempt)
+                except Exception as e:
+                    error = str(e)
+                    break
+            status = SENT if txn else FAILED
+            self.ledger.append(status, cents, payee_id, key, txn)
+            self.commit_waiters.append((key, future, self._result(key, status, cents, payee_id, txn, error=None if txn else error)))
+            self.dirty.set()
+            queue.task_done()
+
+    async def _committer(self):
+        while True:
+            await self.dirty.wait()
+            await asyncio.sleep(self.commit_interval)
+            self.dirty.clear()
+            waiters, self.commit_waiters = self.commit_waiters, []
+            self.ledger.sync()
+            for key, future, result in waiters:
+                self.inflight.pop(key, None)
+                if not future.done():
+                    future.set_result(result)
+
+    async def _pay_many(self, payments):
+        for _, payee_id, _ in payments:
+            if len(payee_id.encode("utf-8")) > 48:
+                raise ValueError(f"Payee id longer than 48 bytes: {payee_id!r}")
+        futures = [self._submit(cents, payee_id, key) for cents, payee_id, key in payments]
+        return await asyncio.gather(*futures)
+
+    def pay_many(self, payments):
+        """Send (cents, payee_id, key) payments and block until every result is on disk."""
+        return asyncio.run_coroutine_threadsafe(self._pay_many(payments), self.loop).result()
+
+    def pay(self, cents, payee_id, key):
+        return self.pay_many([(cents, payee_id, key)])[0]
+
+    async def _drain(self):
+        while self.inflight:
+            await asyncio.sleep(self.commit_interval)
+
+    def drain(self):
+        """Wait until every queued payment, including ones resumed from the ledger, is settled."""
+        asyncio.run_coroutine_threadsafe(self._drain(), self.loop).result()
+
+    async def _stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def close(self):
+        self.drain()
+        asyncio.run_coroutine_threadsafe(self._stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.ledger.close()
+
+
+payment_engine = None
+engine_lock = threading.Lock()
+
+
+def get_payment_engine():
+    global payment_engine
+    with engine_lock:
+        if payment_engine is None:
+            payment_engine = PaymentEngine()
+            # Settle queued payments and stop the loop before the interpreter tears it down
+            atexit.register(close_payment_engine)
+        return payment_engine
+
+
+def close_payment_engine():
+    global payment_engine
+    with engine_lock:
+        engine, payment_engine = payment_engine, None
+    if engine is not None:
+        engine.close()
+
+
+def summarize_payments(results, limit=10):
+    sent = [r for r in results if r["status"] in ("sent", "duplicate")]
+    failed = [r for r in results if r["status"] == "failed"]
+    lines = [
+        f"{len(sent)} of {len(results)} payments completed "
+        f"({sum(r['status'] == 'duplicate' for r in results)} already sent earlier), "
+        f"total ${sum(r['amount'] for r in sent):,.2f}; {len(failed)} failed."
+    ]
+    for r in sent[:limit]:
+        lines.append(f"- ${r['amount']:.2f} to '{r['payee_id']}': Transaction ID {r['transaction_id']}")
+    if len(sent) > limit:
+        lines.append(f"- ... {len(sent) - limit} more")
+    for r in failed[:limit]:
+        lines.append(f"- FAILED ${r['amount']:.2f} to '{r['payee_id']}': {r['error']}")
+    return "\n".join(lines)
+
 
 # --- Tool Definition ---
 # In a real scenario, you would import this from a library.
@@ -23,37 +345,89 @@ llm = LLM(
 
 class PaymanAITool(BaseTool):
     """
-    A mock tool that simulates sending a payment.
+    A tool that sends a payment through the payment engine.
     It's designed to be used by a CrewAI agent.
     """
     name: str = "send_payment"
     description: str = (
         "Use this tool to send a payment to a specified payee. "
-        "The tool requires the payment amount and the payee's ID."
+        "The tool requires the payment amount and the payee's ID. "
+        "Every payment gets a reference (one is generated when omitted); retry a payment "
+        "with the reference from its confirmation so it is never sent twice."
     )
 
-    def _run(self, amount: float, payee_id: str) -> str:
+    def _run(self, amount: float, payee_id: str, reference: str = "") -> str:
         """
-        Simulates the action of sending a payment.
+        Sends one payment. Retrying with the same amount, payee and reference returns
+        the original transaction instead of paying twice. Without a reference a fresh one
+        is generated, so a later call is a new payment rather than a duplicate.
 
         Args:
             amount (float): The monetary amount to be sent.
             payee_id (str): The unique identifier for the recipient.
+            reference (str): Reference identifying this payment; generated when omitted.
 
         Returns:
-            str: A confirmation message indicating the transaction was successful.
+            str: A confirmation message with the transaction ID, or the failure reason.
         """
-        # In a real tool, this is where you would call the PaymanAI SDK/API
-        print("--- MOCK TOOL EXECUTION ---")
         print(f"Attempting to send ${amount} to {payee_id}...")
-        # Simulate a successful API call
-        confirmation_details = f"Payment of ${amount:.2f} to '{payee_id}' processed successfully. Transaction ID: 8a7d6s5f."
+        reference = reference or uuid.uuid4().hex
+        try:
+            cents = to_cents(amount)
+            result = get_payment_engine().pay(cents, payee_id, idempotency_key("single", reference, payee_id, cents))
+        except Exception as e:
+            return f"Payment of ${amount} to '{payee_id}' failed: {str(e)}"
+        if result["status"] == "failed":
+            return f"Payment of ${amount:.2f} to '{payee_id}' failed: {result['error']} (reference {reference})"
+        confirmation_details = (
+            f"Payment of ${amount:.2f} to '{payee_id}' processed successfully. "
+            f"Transaction ID: {result['transaction_id']}. Reference: {reference}."
+        )
+        if result["status"] == "duplicate":
+            confirmation_details += " (This payment had already been sent; no new payment was made.)"
         print(f"Success: {confirmation_details}")
-        print("--------------------------")
         return confirmation_details
 
-# Instantiate your tool
+
+class BulkPaymanAITool(BaseTool):
+    """
+    Sends a batch of payments concurrently through the payment engine.
+    """
+    name: str = "send_payments"
+    description: str = (
+        "Use this tool to send many payments at once. 'payments' is a list of "
+        "[amount, payee_id] pairs (or objects with 'amount' and 'payee_id'). "
+        "A batch_id is generated when omitted; re-running with the same batch_id never pays anyone twice."
+    )
+
+    def _run(self, payments: list, batch_id: str = "") -> str:
+        """
+        Args:
+            payments (list): (amount, payee_id) pairs or {"amount", "payee_id"} objects.
+            batch_id (str): Identifier for this payout batch, used for idempotency keys;
+                generated when omitted, so every call without one is a new batch.
+
+        Returns:
+            str: A summary of sent and failed payments with transaction IDs.
+        """
+        batch_id = batch_id or uuid.uuid4().hex
+        try:
+            batch = []
+            for index, payment in enumerate(payments):
+                if isinstance(payment, dict):
+                    amount, payee_id = payment["amount"], payment["payee_id"]
+                else:
+                    amount, payee_id = payment
+                cents = to_cents(amount)
+                batch.append((cents, str(payee_id), idempotency_key("batch", batch_id, index, payee_id, cents)))
+            print(f"Sending {len(batch)} payments (batch '{batch_id}')...")
+            return f"Batch '{batch_id}': " + summarize_payments(get_payment_engine().pay_many(batch))
+        except Exception as e:
+            return f"Batch payment failed before sending: {str(e)}"
+
+# Instantiate your tools
 payment_tool = PaymanAITool()
+bulk_payment_tool = BulkPaymanAITool()
 
 
 # --- Agent Definition ---
@@ -62,7 +436,8 @@ payment_agent = Agent(
     role='Financial Transactions Specialist',
     goal=(
         'To accurately process payment requests by identifying the '
-        'correct amount and payee, and then using the send_payment tool.'
+        'correct amount and payee, and then using the send_payment tool, '
+        'or the send_payments tool for payout batches.'
     ),
     backstory=(
         'You are an advanced AI agent with expertise in financial operations. '
@@ -76,7 +451,7 @@ payment_agent = Agent(
     # Set verbose to True to see the agent's thought process
     verbose=True,
     # The list of tools this agent can use
-    tools=[payment_tool],
+    tools=[payment_tool, bulk_payment_tool],
     # Assign the LLM to the agent
     llm=llm
 )
@@ -109,11 +484,93 @@ payment_crew = Crew(
 )
 
 
+# --- Load Benchmark ---
+def benchmark_payments(n_payments=50000, n_payees=5000, latency=0.02, failure_rate=0.01, workers=PAYMENT_WORKERS):
+    """Throughput, idempotent replay, per-payee ordering and crash recovery against the mock backend."""
+    workdir = tempfile.mkdtemp(prefix="payman_bench_")
+    ledger_path = os.path.join(workdir, "ledger.bin")
+    rng = random.Random(0)
+    batch = []
+    for index in range(n_payments):
+        payee_id = f"payee{rng.randrange(n_payees)}"
+        cents = rng.randrange(100, 50000)
+        batch.append((cents, payee_id, idempotency_key("batch", "bench", index, payee_id, cents)))
+
+    # One payment per call, as the original tool did
+    backend = MockPaymanBackend(latency)
+    serial = 200
+
+    async def send_serially():
+        for cents, payee_id, key in batch[:serial]:
+            await backend.send(key, cents, payee_id)
+
+    start = time.perf_counter()
+    asyncio.run(send_serially())
+    serial_rate = serial / (time.perf_counter() - start)
+    print(f"serial (1 call per payment) : {serial_rate:8.0f} payments/sec "
+          f"-> {n_payments / serial_rate / 60:.1f} min for {n_payments}")
+
+    backend = MockPaymanBackend(latency, failure_rate)
+    engine = PaymentEngine(backend, Ledger(ledger_path), workers)
+    start = time.perf_counter()
+    results = engine.pay_many(batch)
+    elapsed = time.perf_counter() - start
+    sent = sum(r["status"] == "sent" for r in results)
+    print(f"{f'engine ({workers} workers)':<28}: {n_payments / elapsed:8.0f} payments/sec "
+          f"-> {elapsed:.1f} s for {n_payments} ({sent} sent, {n_payments - sent} failed, "
+          f"{failure_rate:.0%} transient error rate)")
+
+    calls = backend.calls
+    start = time.perf_counter()
+    replay = engine.pay_many(batch)
+    print(f"replay of the same batch    : {len(replay) / (time.perf_counter() - start):8.0f} payments/sec, "
+          f"{sum(r['status'] == 'duplicate' for r in replay)} duplicates, {backend.calls - calls} backend calls")
+
+    expected = defaultdict(list)
+    for cents, payee_id, key in batch:
+        if key in backend.transactions:
+            expected[payee_id].append(key)
+    in_order = all(backend.order[payee_id] == keys for payee_id, keys in expected.items())
+    print(f"per-payee ordering          : {'preserved' if in_order else 'VIOLATED'} across {len(expected)} payees")
+    engine.close()
+
+    # Crash: 1000 payments accepted but never settled, 200 of them already paid upstream,
+    # and a torn record at the tail of the ledger
+    ledger = Ledger(ledger_path)
+    crashed = []
+    for index in range(1000):
+        payee_id = f"payee{index % n_payees}"
+        key = idempotency_key("crash", index)
+        ledger.append(ACCEPTED, 1000, payee_id, key)
+        crashed.append(key)
+    for key in crashed[:200]:
+        backend.transactions[key] = uuid.uuid4().hex[:16]
+    ledger.mm[ledger.offset:ledger.offset + RECORD.size // 2] = RECORD_MAGIC + b"\x02" * (RECORD.size // 2 - 4)
+    ledger.close()
+
+    charged = len(backend.transactions)
+    start = time.perf_counter()
+    ledger = Ledger(ledger_path)
+    recovered_torn = ledger.torn_records
+    engine = PaymentEngine(backend, ledger, workers)
+    engine.drain()
+    settled = sum(engine.ledger.state[key][0] == SENT for key in crashed)
+    print(f"crash recovery              : {engine.recovered} pending resumed, {recovered_torn} torn record dropped, "
+          f"{settled} settled, {len(backend.transactions) - charged} new charges (800 expected) "
+          f"in {time.perf_counter() - start:.2f} s")
+    engine.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
 # --- Execute the Crew ---
 # The kickoff() method starts the crew's execution.
-print("🚀 Starting Crew Execution...")
-result = payment_crew.kickoff()
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark_payments()
+    else:
+        print("🚀 Starting Crew Execution...")
+        result = payment_crew.kickoff()
 
-print("\n✅ Crew Execution Finished.")
-print("\nFinal Result:")
-print(result)
+        print("\n✅ Crew Execution Finished.")
+        print("\nFinal Result:")
+        print(result)
@@ -1,9 +1,16 @@
 #!/usr/bin/env python3
 import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
 from crewai import Agent, Task, Crew, LLM
 from crewai.tools import tool
 from dotenv import load_dotenv
-from langchain_writer.tools import GraphTool
 from langchain_writer import ChatWriter
 from langchain_writer.tools import NoCodeAppTool
 
@@ -11,50 +18,195 @@ load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 WRITER_API_KEY = os.getenv("WRITER_API_KEY")
+BACKEND_TIMEOUT = float(os.getenv("WRITER_BACKEND_TIMEOUT", "120"))
+GRAPH_CACHE_TTL = float(os.getenv("WRITER_GRAPH_CACHE_TTL", "600"))
+GRAPH_CACHE_MAX_ENTRIES = int(os.getenv("WRITER_GRAPH_CACHE_MAX_ENTRIES", "512"))
+RRF_K = 60
+# Set WRITER_STREAM=0 to wait for complete responses instead of streaming tokens
+STREAM_OUTPUT = os.getenv("WRITER_STREAM", "1") != "0"
 
-def setup_gemini_llm():
+def setup_gemini_llm(stream=False):
     return LLM(
         model="gemini/gemini-2.5-flash",
         api_key=GEMINI_API_KEY,
         temperature=0.7,
-        max_tokens=4096
+        max_tokens=4096,
+        stream=stream
     )
 
-@tool("Writer Knowledge Graph Search")
-def search_knowledge_graph(query: str, graph_id: str = None) -> str:
+_token_callbacks = []
+_agent_stream_attached = False
+
+def add_token_callback(callback):
+    """Register callback(source, text) for streamed tokens; returns a function that removes it."""
+    _token_callbacks.append(callback)
+    return lambda: _token_callbacks.remove(callback)
+
+def emit_token(source, text):
+    for callback in list(_token_callbacks):
+        callback(source, text)
+
+def stream_chat(chat, prompt, source="writer"):
+    """Consume `chat.stream(prompt)`, forwarding each piece to the token callbacks; returns the full text."""
+    parts = []
+    for chunk in chat.stream(prompt):
+        text = chunk.content if hasattr(chunk, "content") else str(chunk)
+        if text:
+            parts.append(text)
+            emit_token(source, text)
+    return "".join(parts)
+
+def attach_agent_stream():
     """
-    Search the Writer Knowledge Graph for information.
-    
-    Args:
-        query: Search query for the knowledge graph
-        graph_id: Optional graph ID (will use environment variable if not provided)
+    Forward the crew LLM's streamed chunks to the token callbacks via crewai's event bus.
+    Returns False when this crewai version has no stream events (the CLI then only
+    streams Writer tool output).
+    """
+    global _agent_stream_attached
+    if _agent_stream_attached:
+        return True
+    try:
+        from crewai.events import crewai_event_bus, LLMStreamChunkEvent
+    except ImportError:
+        try:
+            from crewai.utilities.events import crewai_event_bus, LLMStreamChunkEvent
+        except ImportError:
+            return False
+
+    @crewai_event_bus.on(LLMStreamChunkEvent)
+    def on_chunk(source, event):
+        emit_token("agent", event.chunk)
+
+    _agent_stream_attached = True
+    return True
+
+class StreamPrinter:
+    """Token callback that prints pieces as they arrive, with a label whenever the source changes."""
+
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.source = None
+        self.lock = threading.Lock()
+
+    def __call__(self, source, text):
+        with self.lock:
+            if source != self.source:
+                self.out.write(f"\n[{source}] ")
+                self.source = source
+            self.out.write(text)
+            self.out.flush()
+
+_writer_client = None
+_graph_pool = ThreadPoolExecutor(max_workers=16)
+_graph_cache = OrderedDict()  # LRU: least recently used (graph, query) first
+_graph_lock = threading.Lock()
+
+def get_writer_client():
+    """One Writer SDK client (and its HTTP connection pool) shared by all graph queries."""
+    global _writer_client
+    with _graph_lock:
+        if _writer_client is None:
+            from writerai import Writer
+            _writer_client = Writer(api_key=WRITER_API_KEY)
+    return _writer_client
+
+def parse_graph_ids(graph_id=None):
+    """Graph IDs from a comma-separated argument, else WRITER_GRAPH_IDS, else WRITER_GRAPH_ID."""
+    raw = graph_id or os.getenv("WRITER_GRAPH_IDS") or os.getenv("WRITER_GRAPH_ID") or ""
+    return list(dict.fromkeys(g.strip() for g in raw.split(",") if g.strip()))
+
+def query_graph(graph_id, query):
+    """
+    Ask one graph, with responses cached per (graph, query) for GRAPH_CACHE_TTL seconds.
+    The cache keeps at most GRAPH_CACHE_MAX_ENTRIES answers, evicting the least recently used.
+
     Returns:
-        String containing knowledge graph search results
+        (answer, sources) where sources is a ranked list of {"file_id", "snippet"}
+    """
+    key = (graph_id, " ".join(query.lower().split()))
+    with _graph_lock:
+        cached = _graph_cache.get(key)
+        if cached and time.monotonic() - cached[0] < GRAPH_CACHE_TTL:
+            _graph_cache.move_to_end(key)
+            return cached[1]
+        _graph_cache.pop(key, None)
+
+    response = get_writer_client().graphs.question(graph_ids=[graph_id], question=query, subqueries=False)
+    sources = [
+        {"file_id": getattr(source, "file_id", ""), "snippet": getattr(source, "snippet", str(source))}
+        for source in getattr(response, "sources", None) or []
+    ]
+    result = (getattr(response, "answer", "") or "", sources)
+    with _graph_lock:
+        _graph_cache[key] = (time.monotonic(), result)
+        _graph_cache.move_to_end(key)
+        while len(_graph_cache) > GRAPH_CACHE_MAX_ENTRIES:
+            _graph_cache.popitem(last=False)
+    return result
+
+def reciprocal_rank_fusion(ranked_lists, k=RRF_K):
     """
+    Merge {graph_id: ranked sources} into one list scored by sum(1 / (k + rank)).
+    Sources are matched by file ID and snippet text, so a passage found in several graphs
+    accumulates score from each.
+    """
+    merged = {}
+    for graph_id, sources in ranked_lists.items():
+        for rank, source in enumerate(sources, 1):
+            key = hashlib.sha1(f"{source['file_id']}|{' '.join(source['snippet'].split())}".encode("utf-8")).hexdigest()
+            entry = merged.setdefault(key, dict(source, score=0.0, graphs=[]))
+            entry["score"] += 1.0 / (k + rank)
+            entry["graphs"].append(graph_id)
+    return sorted(merged.values(), key=lambda e: -e["score"])
+
+def run_graph_search(query, graph_id=None, max_sources=10):
     try:        
-        if not graph_id:
-            graph_id = os.getenv("WRITER_GRAPH_ID")
+        graph_ids = parse_graph_ids(graph_id)
             
-        if not graph_id:
+        if not graph_ids:
             return "Error: No graph ID provided. Set WRITER_GRAPH_ID environment variable."
-        
-        graph_tool = GraphTool(graph_ids=[graph_id])
-        return graph_tool.invoke(query)
+
+        futures = {g: _graph_pool.submit(query_graph, g, query) for g in graph_ids}
+        answers, ranked, errors = {}, {}, []
+        for g, future in futures.items():
+            try:
+                answers[g], ranked[g] = future.result()
+            except Exception as e:
+                errors.append(f"{g}: {str(e)}")
+        if not answers:
+            return "Error searching knowledge graph: " + "; ".join(errors)
+        if len(graph_ids) == 1 and not errors:
+            answer, sources = answers[graph_ids[0]], ranked[graph_ids[0]]
+            return answer + "".join(f"\n- {s['snippet']}" for s in sources[:max_sources])
+
+        lines = ["Answers by graph:"]
+        lines += [f"[{g}] {answer}" for g, answer in answers.items() if answer]
+        fused = reciprocal_rank_fusion(ranked)[:max_sources]
+        if fused:
+            lines.append(f"\nTop sources across {len(answers)} graphs (reciprocal-rank fusion):")
+            lines += [f"{i}. {e['snippet']} (graphs: {', '.join(e['graphs'])})" for i, e in enumerate(fused, 1)]
+        if errors:
+            lines.append("\nGraphs that failed: " + "; ".join(errors))
+        return "\n".join(lines)
         
     except Exception as e:
         return f"Error searching knowledge graph: {str(e)}"
 
-@tool("Writer Chat Completion")
-def writer_chat_completion(prompt: str, model: str = "palmyra-x5") -> str:
+@tool("Writer Knowledge Graph Search")
+def search_knowledge_graph(query: str, graph_id: str = None) -> str:
     """
-    Generate text using Writer's chat models.
+    Search one or more Writer Knowledge Graphs for information.
     
     Args:
-        prompt: Text prompt for generation
-        model: Writer model to use (default: palmyra-x5)
+        query: Search query for the knowledge graph
+        graph_id: Optional graph ID, or several comma-separated IDs searched in parallel
+            (will use WRITER_GRAPH_IDS / WRITER_GRAPH_ID if not provided)
     Returns:
-        Generated text response
+        String containing knowledge graph search results
     """
+    return run_graph_search(query, graph_id)
+
+def run_chat_completion(prompt, model="palmyra-x5"):
     try:
         chat = ChatWriter(
             model=model,
@@ -62,6 +214,8 @@ def writer_chat_completion(prompt: str, model: str = "palmyra-x5") -> str:
             api_key=WRITER_API_KEY
         )
         
+        if STREAM_OUTPUT:
+            return stream_chat(chat, prompt)
         response = chat.invoke(prompt)
         return response.content
         
@@ -70,17 +224,20 @@ def writer_chat_completion(prompt: str, model: str = "palmyra-x5") -> str:
     except Exception as e:
         return f"Error with Writer chat completion: {str(e)}"
 
-@tool("Writer NoCode App")
-def use_nocode_app(query: str, app_id: str = None) -> str:
+@tool("Writer Chat Completion")
+def writer_chat_completion(prompt: str, model: str = "palmyra-x5") -> str:
     """
-    Use Writer's no-code application.
+    Generate text using Writer's chat models.
     
     Args:
-        query: Input for the no-code application
-        app_id: No-code app ID (will use environment variable if not provided)
+        prompt: Text prompt for generation
+        model: Writer model to use (default: palmyra-x5)
     Returns:
-        Result from the no-code application
+        Generated text response
     """
+    return run_chat_completion(prompt, model)
+
+def run_nocode_app(query, app_id=None):
     try:
         if not app_id:
             app_id = os.getenv("WRITER_APP_ID")
@@ -102,6 +259,66 @@ def use_nocode_app(query: str, app_id: str = None) -> str:
     except Exception as e:
         return f"Error using no-code app: {str(e)}"
 
+@tool("Writer NoCode App")
+def use_nocode_app(query: str, app_id: str = None) -> str:
+    """
+    Use Writer's no-code application.
+    
+    Args:
+        query: Input for the no-code application
+        app_id: No-code app ID (will use environment variable if not provided)
+    Returns:
+        Result from the no-code application
+    """
+    return run_nocode_app(query, app_id)
+
+def run_all_backends(query, graph_id=None, app_id=None, model="palmyra-x5", timeout=BACKEND_TIMEOUT):
+    """
+    Query the knowledge graph, chat model and no-code app at the same time.
+
+    Returns:
+        List of (section title, text, seconds) in a fixed order; a backend that fails or
+        exceeds `timeout` contributes its error message instead of blocking the others
+    """
+    backends = [
+        ("Knowledge Graph", run_graph_search, (query, graph_id)),
+        ("Chat Completion", run_chat_completion, (f"Write a concise, accurate overview of: {query}", model)),
+        ("NoCode App", run_nocode_app, (query, app_id)),
+    ]
+
+    def timed(fn, args):
+        started = time.perf_counter()
+        return fn(*args), time.perf_counter() - started
+
+    pool = ThreadPoolExecutor(max_workers=len(backends))
+    futures = [pool.submit(timed, fn, args) for _, fn, args in backends]
+    deadline = time.perf_counter() + timeout
+    sections = []
+    for (title, _, _), future in zip(backends, futures):
+        try:
+            text, seconds = future.result(timeout=max(deadline - time.perf_counter(), 0))
+        except Exception as e:
+            text, seconds = f"Error: {title} did not respond ({type(e).__name__})", timeout
+        sections.append((title, str(text), seconds))
+    pool.shutdown(wait=False)
+    return sections
+
+@tool("Writer All Tools Research")
+def writer_research_all(query: str, graph_id: str = None, app_id: str = None) -> str:
+    """
+    Run the Writer Knowledge Graph, Chat Completion and NoCode App on the same query
+    concurrently and return one sectioned result.
+    
+    Args:
+        query: Topic or question to research with every Writer backend
+        graph_id: Optional graph ID(s), comma-separated (will use environment variables if not provided)
+        app_id: Optional no-code app ID (will use environment variable if not provided)
+    Returns:
+        Markdown with one section per backend
+    """
+    sections = run_all_backends(query, graph_id, app_id)
+    return "\n\n".join(f"## {title} ({seconds:.1f}s)\n{text}" for title, text, seconds in sections)
+
 def create_writer_specialist(llm):
     return Agent(
         role="Writer AI Specialist",
@@ -112,7 +329,7 @@ def create_writer_specialist(llm):
             "advanced chat models for text generation, and no-code applications for "
             "specialized tasks. You know how to choose the right tool for each situation."
         ),
-        tools=[search_knowledge_graph, writer_chat_completion, use_nocode_app],
+        tools=[search_knowledge_graph, writer_chat_completion, use_nocode_app, writer_research_all],
         llm=llm,
         verbose=True,
         allow_delegation=False
@@ -123,7 +340,7 @@ def create_writer_task(task_type, query):
         "knowledge": f"Use the Writer Knowledge Graph to find comprehensive information about '{query}'. Provide detailed insights and analysis.",
         "generate": f"Use Writer's chat models to generate high-quality content about '{query}'. Focus on accuracy and engagement.",
         "nocode": f"Use Writer's no-code application to process '{query}' and provide specialized results.",
-        "all": f"Research '{query}' using all available Writer tools - knowledge graph, chat models, and no-code apps. Provide a comprehensive analysis."
+        "all": f"Research '{query}' with the Writer All Tools Research tool, which queries the knowledge graph, chat models, and no-code app in a single call. Call it once, then provide a comprehensive analysis of the combined results."
     }
     
     expected_outputs = {
@@ -198,8 +415,11 @@ def main():
     
     try:
         # Setup AI
-        llm = setup_gemini_llm()
+        agent_streaming = STREAM_OUTPUT and attach_agent_stream()
+        llm = setup_gemini_llm(stream=agent_streaming)
         agent = create_writer_specialist(llm)
+        if STREAM_OUTPUT:
+            add_token_callback(StreamPrinter())
         
         while True:
             # Get user input
@@ -239,5 +459,126 @@ def main():
     except Exception as e:
         print(f"❌ Error: {e}")
 
+def start_stub_chat_server(tokens=300, first_token_delay=0.3, token_delay=0.01):
+    """
+    Local stand-in for the Writer API's chat endpoint: POST /v1/chat answers with `tokens`
+    words, as one chat completion or as SSE chunks when the request sets "stream": true.
+    Returns (server, base URL) for ChatWriter's base_url / WRITER_BASE_URL.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    words = [f"word{i} " for i in range(tokens)]
+
+    def completion(choice, obj):
+        return {"id": "chat-stub", "object": obj, "created": int(time.time()), "model": "palmyra-x5",
+                "choices": [dict(index=0, **choice)]}
+
+    class StubChatHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            time.sleep(first_token_delay)
+            if not request.get("stream"):
+                time.sleep(token_delay * (tokens - 1))
+                message = {"role": "assistant", "content": "".join(words)}
+                body = json.dumps(completion({"message": message, "finish_reason": "stop"}, "chat.completion")).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(token_delay)
+                chunk = completion({"delta": {"role": "assistant", "content": word}, "finish_reason": None}, "chat.completion.chunk")
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubChatHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def benchmark_streaming(tokens=300, first_token_delay=0.3, token_delay=0.01, runs=3):
+    """
+    Time-to-first-visible-token and total time for blocking vs streamed chat calls,
+    through run_chat_completion and the real ChatWriter pointed at a local stub server.
+    """
+    global STREAM_OUTPUT, WRITER_API_KEY
+    server, base_url = start_stub_chat_server(tokens, first_token_delay, token_delay)
+    saved = (STREAM_OUTPUT, WRITER_API_KEY, os.environ.get("WRITER_BASE_URL"))
+    WRITER_API_KEY = WRITER_API_KEY or "stub-key"
+    os.environ["WRITER_BASE_URL"] = base_url
+    expected = "".join(f"word{i} " for i in range(tokens))
+    print(f"Stub chat: {tokens} tokens, {first_token_delay * 1000:.0f} ms to first token, "
+          f"{token_delay * 1000:.0f} ms/token")
+    try:
+        for label in ("invoke", "stream"):
+            first, total = [], []
+            for _ in range(runs):
+                started = time.perf_counter()
+                seen = []
+                remove = add_token_callback(lambda source, text: seen or seen.append(time.perf_counter()))
+                try:
+                    STREAM_OUTPUT = label == "stream"
+                    text = run_chat_completion("Write a long article.")
+                    if not STREAM_OUTPUT:
+                        emit_token("writer", text)
+                finally:
+                    remove()
+                assert text == expected, f"{label}: unexpected reply {text[:80]!r}"
+                first.append(seen[0] - started)
+                total.append(time.perf_counter() - started)
+            print(f"{label:7s}: first token {sum(first) / runs * 1000:8.1f} ms  total {sum(total) / runs * 1000:8.1f} ms")
+    finally:
+        server.shutdown()
+        STREAM_OUTPUT, WRITER_API_KEY, base = saved
+        if base is None:
+            os.environ.pop("WRITER_BASE_URL", None)
+        else:
+            os.environ["WRITER_BASE_URL"] = base
+
+def benchmark_graph_search(n_graphs=12, latency=0.2):
+    """Sequential vs parallel cross-graph search and cache hits, against a stub SDK client."""
+    global _writer_client
+
+    class StubGraphs:
+        def question(self, graph_ids, question, subqueries=False):
+            time.sleep(latency)
+            g = int(graph_ids[0].split("-")[1])
+            sources = [SimpleNamespace(file_id=f"file-{(g + i) % 20}", snippet=f"Passage {(g + i) % 20} about {question}")
+                       for i in range(5)]
+            return SimpleNamespace(answer=f"Answer from {graph_ids[0]}", sources=sources)
+
+    _writer_client = SimpleNamespace(graphs=StubGraphs())
+    graph_ids = [f"graph-{i}" for i in range(n_graphs)]
+    print(f"{n_graphs} graphs, stub latency {latency * 1000:.0f} ms")
+
+    _graph_cache.clear()
+    started = time.perf_counter()
+    for g in graph_ids:
+        query_graph(g, "warranty terms")
+    print(f"sequential : {(time.perf_counter() - started) * 1000:8.1f} ms")
+
+    _graph_cache.clear()
+    started = time.perf_counter()
+    result = run_graph_search("warranty terms", ",".join(graph_ids))
+    print(f"parallel   : {(time.perf_counter() - started) * 1000:8.1f} ms")
+    started = time.perf_counter()
+    run_graph_search("Warranty  terms", ",".join(graph_ids))
+    print(f"cached     : {(time.perf_counter() - started) * 1000:8.1f} ms")
+    print(result.split("\n\n")[-1])
+    _writer_client = None
+
 if __name__ == "__main__":
-    main()
+    if "--benchmark-graphs" in sys.argv:
+        benchmark_graph_search()
+    elif "--benchmark" in sys.argv:
+        benchmark_streaming()
+    else:
+        main()
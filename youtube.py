@@ -1,4 +1,15 @@
 import os
+import re
+import ast
+import math
+import sys
+import json
+import time
+import threading
+import requests
+from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 from crewai import Agent, Task, Crew, LLM
@@ -7,6 +18,8 @@ from langchain_community.tools import YouTubeSearchTool
 
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+YOUTUBE_BASE_URL = os.getenv("YOUTUBE_BASE_URL", "https://www.youtube.com")
+YOUTUBE_CACHE_DIR = os.getenv("YOUTUBE_CACHE_DIR", ".youtube_cache")
 
 def setup_gemini_llm():
     return LLM(
@@ -30,6 +43,182 @@ def search_youtube_videos(query: str) -> str:
     except Exception as e:
         return f"Error searching YouTube: {str(e)}"
 
+# ---------------------------------------------------------------------------
+# Metadata enrichment
+# ---------------------------------------------------------------------------
+VIDEO_ID_PATTERN = re.compile(r"(?:v=|youtu\.be/|/shorts/)([A-Za-z0-9_-]{11})")
+META_PATTERNS = {
+    "title": re.compile(r'<meta\s+(?:name|property)="(?:og:)?title"\s+content="([^"]*)"'),
+    "channel": re.compile(r'<link\s+itemprop="name"\s+content="([^"]*)"'),
+    "views": re.compile(r'<meta\s+itemprop="interactionCount"\s+content="(\d+)"'),
+    "duration": re.compile(r'<meta\s+itemprop="duration"\s+content="([^"]*)"'),
+    "published": re.compile(r'<meta\s+itemprop="(?:datePublished|uploadDate)"\s+content="([^"]*)"'),
+}
+ISO_DURATION_PATTERN = re.compile(r"PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?")
+
+
+class HostRateLimiter:
+    """Spaces out requests to the same host by at least `min_interval` seconds."""
+
+    def __init__(self, min_interval=0.2):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class VideoMetadataCache:
+    """On-disk JSON cache of video metadata, one file per video id."""
+
+    def __init__(self, cache_dir=YOUTUBE_CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, video_id):
+        return os.path.join(self.cache_dir, f"{video_id}.json")
+
+    def get(self, video_id):
+        try:
+            with open(self._path(video_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def put(self, video_id, record):
+        tmp_path = self._path(video_id) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+        os.replace(tmp_path, self._path(video_id))
+
+
+def extract_video_ids(search_output):
+    """Pull unique video ids out of the YouTubeSearchTool output, keeping order."""
+    try:
+        urls = ast.literal_eval(search_output)
+        if isinstance(urls, (list, tuple)):
+            search_output = " ".join(str(u) for u in urls)
+    except (ValueError, SyntaxError):
+        pass
+    video_ids = []
+    for video_id in VIDEO_ID_PATTERN.findall(search_output):
+        if video_id not in video_ids:
+            video_ids.append(video_id)
+    return video_ids
+
+
+def parse_iso_duration(value):
+    match = ISO_DURATION_PATTERN.fullmatch(value or "")
+    if not match:
+        return None
+    hours, minutes, seconds = (int(part or 0) for part in match.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def parse_watch_page(video_id, html):
+    """Extract the metadata fields we rank on from a watch page."""
+    fields = {}
+    for key, pattern in META_PATTERNS.items():
+        match = pattern.search(html)
+        fields[key] = match.group(1) if match else None
+    return {
+        "video_id": video_id,
+        "url": f"https://www.youtube.com/watch?v={video_id}",
+        "title": fields["title"],
+        "channel": fields["channel"],
+        "views": int(fields["views"]) if fields["views"] else None,
+        "duration_seconds": parse_iso_duration(fields["duration"]),
+        "published": fields["published"],
+        "has_transcript": '"captionTracks"' in html,
+    }
+
+
+def fetch_video_metadata(video_id, session, rate_limiter, cache, base_url=YOUTUBE_BASE_URL, timeout=10):
+    cached = cache.get(video_id)
+    if cached is not None:
+        return cached
+    url = f"{base_url}/watch?v={video_id}"
+    rate_limiter.wait(url)
+    response = session.get(url, timeout=timeout, headers={"Accept-Language": "en-US,en;q=0.8"})
+    response.raise_for_status()
+    record = parse_watch_page(video_id, response.text)
+    cache.put(video_id, record)
+    return record
+
+
+def score_video(record, now=None):
+    """Higher is better: log-scaled views, decayed by age in days."""
+    now = now or datetime.now(timezone.utc)
+    score = math.log10((record.get("views") or 0) + 1)
+    published = record.get("published")
+    if published:
+        try:
+            published_at = datetime.fromisoformat(published.replace("Z", "+00:00"))
+            if published_at.tzinfo is None:
+                published_at = published_at.replace(tzinfo=timezone.utc)
+            age_days = max((now - published_at).days, 0)
+            score /= 1 + age_days / 365
+        except ValueError:
+            pass
+    if record.get("has_transcript"):
+        score *= 1.1
+    return round(score, 4)
+
+
+def enrich_videos(video_ids, max_workers=8, min_interval=0.2, base_url=YOUTUBE_BASE_URL, cache_dir=YOUTUBE_CACHE_DIR):
+    """
+    Fetch metadata for every video id concurrently and return records ranked by score.
+
+    Args:
+        video_ids: YouTube video ids to enrich
+        max_workers: Size of the thread pool
+        min_interval: Minimum seconds between two requests to the same host
+    Returns:
+        List of metadata dicts sorted best-first, each with a 'score' key
+    """
+    cache = VideoMetadataCache(cache_dir)
+    rate_limiter = HostRateLimiter(min_interval)
+    records = []
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(fetch_video_metadata, video_id, session, rate_limiter, cache, base_url): video_id
+            for video_id in video_ids
+        }
+        for future, video_id in futures.items():
+            try:
+                record = dict(future.result())
+            except Exception as e:
+                record = {"video_id": video_id, "url": f"https://www.youtube.com/watch?v={video_id}", "error": str(e)}
+            record["score"] = score_video(record) if "error" not in record else 0
+            records.append(record)
+    return sorted(records, key=lambda r: r["score"], reverse=True)
+
+@tool("YouTube Ranked Video Search")
+def search_and_rank_youtube_videos(query: str) -> str:
+    """
+    Args:
+        query: Search query in format 'topic, max_results' or just 'topic'
+    Returns:
+        JSON list of videos ranked by views, recency and transcript availability,
+        with title, channel, views, duration_seconds, published and has_transcript
+    """
+    try:
+        youtube_tool = YouTubeSearchTool()
+        video_ids = extract_video_ids(youtube_tool.run(query))
+        if not video_ids:
+            return "No YouTube videos found."
+        return json.dumps(enrich_videos(video_ids), indent=2)
+    except Exception as e:
+        return f"Error searching YouTube: {str(e)}"
+
 def create_youtube_researcher(llm):
     return Agent(
         role="YouTube URL Finder",
@@ -39,7 +228,7 @@ def create_youtube_researcher(llm):
             "Your job is to locate relevant video URLs and present them in a clean, "
             "organized format without attempting to analyze content you cannot access."
         ),
-        tools=[search_youtube_videos],
+        tools=[search_youtube_videos, search_and_rank_youtube_videos],
         llm=llm,
         verbose=True,
         allow_delegation=False
@@ -128,9 +317,55 @@ def main():
     result = crew.kickoff()
     print(result)
 
+def benchmark_enrichment(num_videos=200, max_workers=16, latency=0.05):
+    """Time cold and warm enrichment against a local stub watch-page server."""
+    import shutil
+    import tempfile
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class StubWatchPage(BaseHTTPRequestHandler):
+        def do_GET(self):
+            video_id = parse_qs(urlparse(self.path).query)["v"][0]
+            captions = '"captionTracks"' if ord(video_id[0]) % 2 else ""
+            time.sleep(latency)
+            body = (
+                f'<meta name="title" content="Video {video_id}">'
+                f'<link itemprop="name" content="Channel {video_id[:3]}">'
+                f'<meta itemprop="interactionCount" content="{sum(map(ord, video_id)) * 1000}">'
+                f'<meta itemprop="duration" content="PT{len(video_id)}M30S">'
+                f'<meta itemprop="datePublished" content="2024-0{1 + ord(video_id[-1]) % 9}-15">'
+                f'{captions}'
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubWatchPage)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    cache_dir = tempfile.mkdtemp(prefix="yt_bench_")
+    video_ids = [f"vid{i:08d}".ljust(11, "x") for i in range(num_videos)]
+    try:
+        for label in ("cold", "warm"):
+            start = time.perf_counter()
+            records = enrich_videos(video_ids, max_workers=max_workers, min_interval=0, base_url=base_url, cache_dir=cache_dir)
+            elapsed = time.perf_counter() - start
+            print(f"{label}: {len(records)} videos in {elapsed:.3f}s ({len(records) / elapsed:.1f} videos/sec)")
+    finally:
+        server.shutdown()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
 def run():
     """Alternative entry point for crewai run command"""
     main()
 
 if __name__ == "__main__":
-    main()
+    if "--benchmark" in sys.argv:
+        benchmark_enrichment()
+    else:
+        main()